@@ -0,0 +1,168 @@
+"""Parser throughput benchmark for import_all_sec_data.py.
+
+Times the parse and derive phases on the bundled goog_facts.json and on synthetically
+scaled copies of it, with the database and prices stubbed out. Results are written
+as JSON so runs from different versions can be compared (--baseline).
+
+Usage:
+    python benchmark_parser.py
+    python benchmark_parser.py --scales 1 4 16 --repeat 5 --output parser_benchmark.json
+    python benchmark_parser.py --baseline parser_benchmark_old.json
+"""
+import argparse
+import copy
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from import_all_sec_data import (METRIC_PLAN, QUARTERLY_COLUMNS, QUARTERLY_TABLE, SELECTED_TAGS,
+                                 build_table_rows, parse_company_facts, parse_company_payload,
+                                 parse_selected_facts)
+
+SAMPLE_FILE = 'goog_facts.json'
+SAMPLE_CIK = '0001652044'
+SAMPLE_TICKER = 'GOOGL'
+SAMPLE_PRICE = 302.02
+DEFAULT_OUTPUT = 'parser_benchmark.json'
+COLUMNS_BY_TABLE = {'sec_financial_reports': METRIC_PLAN.columns, QUARTERLY_TABLE: QUARTERLY_COLUMNS}
+
+def count_facts(company_data):
+    """Number of fact items in a companyfacts payload."""
+    return sum(len(items) for taxonomy in company_data.get('facts', {}).values()
+               for details in taxonomy.values() for items in details.get('units', {}).values())
+
+def scale_payload(company_data, factor):
+    """Returns a copy of company_data roughly `factor` times larger.
+
+    Concepts METRIC_MAP does not read are copied factor-1 times under new names, and
+    the facts of mapped concepts are repeated as 10-K/A restatements, so both the
+    bytes a parser can skip and the facts it must keep grow with the factor.
+    """
+    scaled = copy.deepcopy(company_data)
+    for taxonomy, concepts in scaled.get('facts', {}).items():
+        for tag, details in list(concepts.items()):
+            if taxonomy == 'us-gaap' and tag in SELECTED_TAGS:
+                for unit, items in details.get('units', {}).items():
+                    restated = [dict(item, form='10-K/A') if item.get('form') == '10-K' else item for item in items]
+                    details['units'][unit] = items + restated * (factor - 1)
+            else:
+                for i in range(1, factor):
+                    concepts[f"{tag}Scaled{i}"] = details
+    return scaled
+
+def measure(fn, repeat):
+    """Runs fn `repeat` times, then once more under tracemalloc.
+
+    Returns ({'median_ms', 'min_ms', 'peak_alloc_mb'}, last result).
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = {
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'peak_alloc_mb': round(peak / (1024 * 1024), 2),
+    }
+    return stats, result
+
+def bench_payload(name, raw, repeat):
+    """Benchmarks every phase on one raw payload and returns its result entry."""
+    facts = count_facts(json.loads(raw))
+    phases = {}
+    phases['parse_selected'], (selected, _) = measure(lambda: parse_selected_facts(raw), repeat)
+    phases['parse_full'], _ = measure(lambda: parse_company_facts(raw), repeat)
+    phases['derive'], _ = measure(lambda: build_table_rows(selected, SAMPLE_CIK, SAMPLE_PRICE, COLUMNS_BY_TABLE), repeat)
+    # What the import pipeline's parse workers spend per company
+    phases['parse_company_payload'], _ = measure(
+        lambda: parse_company_payload(SAMPLE_CIK, SAMPLE_TICKER, raw, SAMPLE_PRICE, COLUMNS_BY_TABLE), repeat)
+
+    ms_per_company = phases['parse_company_payload']['median_ms']
+    return {
+        'payload': name,
+        'payload_mb': round(len(raw) / (1024 * 1024), 2),
+        'facts': facts,
+        'ms_per_company': round(ms_per_company, 3),
+        'facts_per_s': round(facts / (ms_per_company / 1000)) if ms_per_company else None,
+        'phases': phases,
+    }
+
+def git_revision():
+    """Short commit hash of this checkout, or None outside git."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, baseline=None):
+    """Prints one line per payload, with the change against a baseline run if given."""
+    previous = {r['payload']: r for r in (baseline or {}).get('results', [])}
+    for r in results:
+        line = (f"{r['payload']:<10} {r['payload_mb']:>7.2f} MB {r['facts']:>8} facts "
+                f"{r['ms_per_company']:>9.2f} ms/company {r['facts_per_s']:>10} facts/s "
+                f"peak {r['phases']['parse_selected']['peak_alloc_mb']:.1f} MB (full parse "
+                f"{r['phases']['parse_full']['peak_alloc_mb']:.1f} MB)")
+        old = previous.get(r['payload'])
+        if old and old.get('ms_per_company'):
+            change = (r['ms_per_company'] - old['ms_per_company']) / old['ms_per_company'] * 100
+            line += f"  {change:+.1f}% vs {baseline.get('revision') or 'baseline'}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the companyfacts parse/derive phases.')
+    parser.add_argument('--sample', default=SAMPLE_FILE, help=f'companyfacts JSON to benchmark (default: {SAMPLE_FILE}).')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16], help='Scale factors of synthetic payloads; 1 is the sample itself (default: 1 4 16).')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per phase (default: 5).')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'Where to write the JSON results (default: {DEFAULT_OUTPUT}).')
+    parser.add_argument('--baseline', help='Earlier results file to compare ms/company against.')
+    args = parser.parse_args()
+
+    # The importer logs per-year warnings while deriving; keep the benchmark output readable
+    logging.getLogger().setLevel(logging.ERROR)
+
+    with open(args.sample, 'rb') as f:
+        sample_raw = f.read()
+    sample = json.loads(sample_raw)
+
+    results = []
+    for factor in args.scales:
+        if factor == 1:
+            raw = sample_raw
+        else:
+            raw = json.dumps(scale_payload(sample, factor), separators=(',', ':')).encode('utf-8')
+        results.append(bench_payload(f"x{factor}", raw, args.repeat))
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sample': args.sample,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
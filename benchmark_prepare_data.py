@@ -0,0 +1,164 @@
+"""Before/after benchmark for stock_selection_engine.data_processor.prepare_data.
+
+Builds a synthetic sec_financial_reports frame at full-universe size and times the
+row-wise `df.apply(axis=1)` versions of revenue_cagr_3y, ocf_to_ebit, the gross_margin
+fallback and cash_ratio that prepare_data used to run against their vectorised
+replacements. Every metric is also checked for NaNs in the same rows and the largest
+relative difference (NumPy's pow may differ from Python's in the last bit).
+
+Usage:
+    python benchmark_prepare_data.py
+    python benchmark_prepare_data.py --companies 15000 --years 10 --repeat 3 --output prepare_data_benchmark.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from stock_selection_engine.data_processor import calculate_cagr, calculate_cash_ratio, prepare_data
+
+DEFAULT_OUTPUT = 'prepare_data_benchmark.json'
+VALUE_COLUMNS = ('revenue', 'net_income', 'eps', 'operating_cash_flow', 'shareholders_equity', 'total_liabilities',
+                 'capital_expenditures', 'operating_income', 'total_assets', 'total_current_liabilities',
+                 'long_term_debt', 'short_term_borrowings', 'ebit', 'gross_profit',
+                 'cash_and_short_term_investments', 'cash_and_equivalents')
+MISSING_RATE = 0.15 # Share of values left NULL, as in sparse XBRL coverage
+ZERO_RATE = 0.02
+NEGATIVE_RATE = 0.1
+
+def make_universe(companies, years, seed):
+    """Synthetic report rows: `years` fiscal years per company with missing, zero and negative values."""
+    rng = np.random.default_rng(seed)
+    n = companies * years
+    df = pd.DataFrame({
+        'cik': np.repeat(np.arange(1, companies + 1), years).astype(str),
+        'fiscal_year': np.tile(np.arange(2024 - years + 1, 2025), companies),
+    })
+    for col in VALUE_COLUMNS:
+        values = rng.lognormal(mean=18, sigma=2, size=n)
+        values[rng.random(n) < NEGATIVE_RATE] *= -1
+        values[rng.random(n) < ZERO_RATE] = 0
+        values[rng.random(n) < MISSING_RATE] = np.nan
+        df[col] = values
+    # Rows arrive from the database in no particular order
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+# --- Row-wise versions prepare_data used before (the "before" side) ---
+
+def rowwise_cagr(end, start, years):
+    if start <= 0 or pd.isna(start) or pd.isna(end) or end <= 0:
+        return np.nan
+    return (end / start)**(1/years) - 1
+
+def rowwise_cash_ratio(row):
+    liabilities = row.get('total_current_liabilities')
+    if not liabilities or liabilities == 0:
+        return np.nan
+    cash = row.get('cash_and_short_term_investments')
+    if pd.isna(cash):
+        cash = row.get('cash_and_equivalents')
+    if pd.isna(cash):
+        return np.nan
+    return cash / liabilities
+
+METRICS = {
+    'revenue_cagr_3y': (
+        lambda df: df.apply(lambda row: rowwise_cagr(row['revenue'], row['revenue_3y_ago'], 3), axis=1),
+        lambda df: calculate_cagr(df['revenue'], df['revenue_3y_ago'], 3)),
+    'ocf_to_ebit': (
+        lambda df: df.apply(lambda row: row['operating_cash_flow'] / row['ebit'] if pd.notna(row.get('ebit')) and row['ebit'] != 0 else np.nan, axis=1),
+        lambda df: (df['operating_cash_flow'] / df['ebit']).where(df['ebit'].notna() & (df['ebit'] != 0))),
+    'gross_margin': (
+        lambda df: df.apply(lambda row: (row['gross_profit'] / row['revenue'] * 100) if row['revenue'] and row['revenue'] != 0 else np.nan, axis=1),
+        lambda df: (df['gross_profit'] / df['revenue'] * 100).where(df['revenue'] != 0)),
+    'cash_ratio': (
+        lambda df: df.apply(rowwise_cash_ratio, axis=1),
+        lambda df: calculate_cash_ratio(df)),
+}
+
+def measure(fn, repeat):
+    """Runs fn `repeat` times; returns (median seconds, last result)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def compare(before, after):
+    """Returns (NaN in the same rows, largest relative difference elsewhere)."""
+    before = before.to_numpy(dtype=float)
+    after = after.to_numpy(dtype=float)
+    same_nan = bool(np.array_equal(np.isnan(before), np.isnan(after)))
+    both = ~np.isnan(before) & ~np.isnan(after) & (before != 0)
+    max_rel_diff = float(np.max(np.abs(after[both] - before[both]) / np.abs(before[both]), initial=0.0))
+    return same_nan, max_rel_diff
+
+def git_revision():
+    """Short commit hash of this checkout, or None outside git."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prepare_data row-wise metrics against their vectorised versions.')
+    parser.add_argument('--companies', type=int, default=15000, help='Synthetic companies (default: 15000).')
+    parser.add_argument('--years', type=int, default=10, help='Fiscal years per company (default: 10, i.e. 150k rows).')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per variant (default: 3).')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42).')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'Where to write the JSON results (default: {DEFAULT_OUTPUT}).')
+    args = parser.parse_args()
+
+    universe = make_universe(args.companies, args.years, args.seed)
+    print(f"Synthetic universe: {len(universe)} rows, {args.companies} companies.")
+
+    # The metrics read prepare_data's inputs, so time them on a prepared frame
+    prepared = prepare_data(universe.copy())
+    results = {}
+    for name, (rowwise, vectorised) in METRICS.items():
+        before_s, before = measure(lambda: rowwise(prepared), args.repeat)
+        after_s, after = measure(lambda: vectorised(prepared), args.repeat)
+        same_nan, max_rel_diff = compare(before, after)
+        results[name] = {
+            'before_ms': round(before_s * 1000, 2),
+            'after_ms': round(after_s * 1000, 2),
+            'speedup': round(before_s / after_s, 1) if after_s else None,
+            'same_nan': same_nan,
+            'max_rel_diff': max_rel_diff,
+        }
+        print(f"{name:<16} {before_s * 1000:>10.1f} ms -> {after_s * 1000:>8.2f} ms "
+              f"({results[name]['speedup']}x) same NaNs={same_nan} max rel diff={max_rel_diff:.1e}")
+
+    # The universe has no gross_margin column, so the fallback is part of this timing
+    total_s, _ = measure(lambda: prepare_data(universe.copy()), args.repeat)
+    saved_s = sum(r['before_ms'] - r['after_ms'] for r in results.values()) / 1000
+    print(f"prepare_data     {total_s + saved_s:>10.2f} s  -> {total_s:>8.2f} s "
+          f"({(total_s + saved_s) / total_s:.1f}x) on {len(universe)} rows")
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'rows': len(universe),
+        'repeat': args.repeat,
+        'metrics': results,
+        'prepare_data_after_s': round(total_s, 3),
+        'prepare_data_before_s': round(total_s + saved_s, 3), # after + time saved on the four metrics
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
-from import_all_sec_data import METRIC_MAP
-hardcoded = ['cik', 'fiscal_year', 'filing_date', 'form', 'price']
-all_cols = hardcoded + list(METRIC_MAP.keys())
+from import_all_sec_data import METRIC_PLAN
+all_cols = METRIC_PLAN.columns
 for i, col in enumerate(all_cols):
     print(f"{i}: {col}")
@@ -1,9 +1,7 @@
-import json
-import gzip
+from sec_archive import DATA_DIR, find_archive, load_archive
 
 def compare_metrics(metrics):
-    with gzip.open('sec_data/CIK0001652044.json.gz', 'rb') as f:
-        data = json.load(f)
+    data = load_archive(find_archive(DATA_DIR, '0001652044'))
     for metric_name in metrics:
         print(f"\n--- {metric_name} ---")
         metric_data = data['facts'].get('us-gaap', {}).get(metric_name, {})
@@ -0,0 +1,23 @@
+-- Migration script to add the fact store used by import_all_sec_data.py --store-facts / --rederive
+
+CREATE TABLE IF NOT EXISTS `sec_facts` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `cik` varchar(10) NOT NULL,
+  `taxonomy` varchar(32) NOT NULL,
+  `tag` varchar(255) NOT NULL,
+  `unit` varchar(64) NOT NULL,
+  `fy` int(11) DEFAULT NULL,
+  `fp` varchar(4) DEFAULT NULL,
+  `start` date DEFAULT NULL,
+  `end` date DEFAULT NULL,
+  `val` double DEFAULT NULL,
+  `accn` varchar(25) DEFAULT NULL,
+  `form` varchar(20) DEFAULT NULL,
+  `filed` date DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `cik` (`cik`),
+  KEY `tag` (`tag`, `fp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Verify changes
+DESCRIBE `sec_facts`;
@@ -0,0 +1,35 @@
+-- Migration script to add the quarterly table written by import_all_sec_data.py
+
+CREATE TABLE IF NOT EXISTS `sec_quarterly_reports` (
+  `cik` varchar(10) NOT NULL,
+  `fiscal_year` int(11) NOT NULL,
+  `fiscal_quarter` tinyint(4) NOT NULL,
+  `period_end` date DEFAULT NULL,
+  `form` varchar(20) DEFAULT NULL,
+  `filing_date` date DEFAULT NULL,
+  `revenue` decimal(19,4) DEFAULT NULL,
+  `cost_of_revenue` decimal(19,4) DEFAULT NULL,
+  `gross_profit` decimal(19,4) DEFAULT NULL,
+  `operating_income` decimal(19,4) DEFAULT NULL,
+  `net_income` decimal(19,4) DEFAULT NULL,
+  `eps` decimal(10,4) DEFAULT NULL,
+  `interest_expense` decimal(19,4) DEFAULT NULL,
+  `operating_cash_flow` decimal(19,4) DEFAULT NULL,
+  `capital_expenditures` decimal(19,4) DEFAULT NULL,
+  `total_assets` decimal(19,4) DEFAULT NULL,
+  `total_liabilities` decimal(19,4) DEFAULT NULL,
+  `shareholders_equity` decimal(19,4) DEFAULT NULL,
+  `cash_and_equivalents` decimal(19,4) DEFAULT NULL,
+  `long_term_debt` decimal(19,4) DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  `updated_at` timestamp NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`cik`,`fiscal_year`,`fiscal_quarter`),
+  KEY `cik` (`cik`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Rejects now record which table a value was meant for
+ALTER TABLE `sec_financial_report_rejects`
+ADD COLUMN IF NOT EXISTS `table_name` VARCHAR(64) NOT NULL DEFAULT 'sec_financial_reports' AFTER `id`;
+
+-- Verify changes
+DESCRIBE `sec_quarterly_reports`;
@@ -0,0 +1,17 @@
+-- Migration script to add the rejects table used by import_all_sec_data.py --invalid-values quarantine
+
+CREATE TABLE IF NOT EXISTS `sec_financial_report_rejects` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `table_name` varchar(64) NOT NULL DEFAULT 'sec_financial_reports',
+  `cik` varchar(10) DEFAULT NULL,
+  `fiscal_year` int(11) DEFAULT NULL,
+  `column_name` varchar(64) NOT NULL,
+  `value` varchar(255) DEFAULT NULL,
+  `reason` varchar(100) DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `cik` (`cik`, `fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Verify changes
+DESCRIBE `sec_financial_report_rejects`;
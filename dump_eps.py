@@ -1,9 +1,7 @@
-import json
-import gzip
+from sec_archive import DATA_DIR, find_archive, load_archive
 
 def dump_eps():
-    with gzip.open('sec_data/CIK0001652044.json.gz', 'rb') as f:
-        data = json.load(f)
+    data = load_archive(find_archive(DATA_DIR, '0001652044'))
     eps = data['facts']['us-gaap'].get('EarningsPerShareDiluted', {})
     units = eps.get('units', {}).get('USD/shares', [])
     print(f"Total entries: {len(units)}")
@@ -1,9 +1,7 @@
-import json
-import gzip
+from sec_archive import DATA_DIR, find_archive, load_archive
 
 def find_eps_tags():
-    with gzip.open('sec_data/CIK0001652044.json.gz', 'rb') as f:
-        data = json.load(f)
+    data = load_archive(find_archive(DATA_DIR, '0001652044'))
     facts = data['facts'].get('us-gaap', {})
     eps_tags = [t for t in facts.keys() if 'EarningsPerShare' in t]
     print(f"Found {len(eps_tags)} EPS tags:")
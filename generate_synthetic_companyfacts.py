@@ -0,0 +1,164 @@
+"""Synthetic companyfacts universe generator for offline load tests.
+
+Builds N synthetic companies modelled on goog_facts.json and writes a matching
+company_tickers.json, so import_all_sec_data.py (--from-bulk-zip, --reprocess-archive)
+and everything downstream can be exercised end to end without the SEC.
+
+Companies vary in number of fiscal years, concept coverage, value scale, unit mix,
+10-K/A restatements of 10-K facts and payload size (a heavy-tailed number of extra
+company-specific concepts). Output is deterministic for a given --seed.
+
+Usage:
+    python generate_synthetic_companyfacts.py --companies 10000 --out synthetic
+    python generate_synthetic_companyfacts.py --companies 500 --out synthetic --archives --no-zip
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import random
+import zipfile
+
+TEMPLATE_FILE = 'goog_facts.json'
+SYNTHETIC_CIK_BASE = 9000000000 # Far above real CIKs so synthetic rows are easy to spot and delete
+MIN_YEARS = 3
+UNIT_MIXES = ('usd', 'usd', 'usd', 'mixed', 'foreign') # Weighted choice: mostly plain USD filers
+PER_SHARE_UNITS = ('USD/shares', 'EUR/shares')
+
+def load_template(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        template = json.load(f)
+    end_years = [int(item['end'][:4]) for concepts in template['facts'].values() for details in concepts.values()
+                 for items in details.get('units', {}).values() for item in items if item.get('end')]
+    return template, max(end_years), max(end_years) - min(end_years) + 1
+
+def synthetic_accn(accn, cik):
+    """Moves a template accession number (filer-yy-seq) under the synthetic filer's CIK."""
+    parts = (accn or '').split('-')
+    if len(parts) != 3:
+        return accn
+    return f"{cik:010d}-{parts[1]}-{parts[2]}"
+
+def shift_date(date, days):
+    return (datetime.date.fromisoformat(date) + datetime.timedelta(days=days)).isoformat()
+
+def synthesize_items(items, cik, profile, rng, per_share):
+    """Rewrites one unit's facts for a synthetic company; returns None if nothing is left."""
+    out = []
+    scale = profile['per_share_scale'] if per_share else profile['scale']
+    for item in items:
+        end = item.get('end')
+        if end and int(end[:4]) < profile['first_year']:
+            continue
+        new = dict(item)
+        val = item['val'] * scale
+        new['val'] = round(val, 2) if per_share or not isinstance(item['val'], int) else int(val)
+        new['accn'] = synthetic_accn(item.get('accn'), cik)
+        out.append(new)
+        if item.get('form') == '10-K' and rng.random() < profile['amend_rate']:
+            amended = dict(new)
+            amended['form'] = '10-K/A'
+            if item.get('filed'):
+                amended['filed'] = shift_date(item['filed'], rng.randint(20, 120))
+            amended['val'] = type(new['val'])(new['val'] * rng.uniform(0.97, 1.03))
+            out.append(amended)
+    return out or None
+
+def synthesize_units(units, cik, profile, rng):
+    result = {}
+    for unit, items in units.items():
+        per_share = unit in PER_SHARE_UNITS
+        new_items = synthesize_items(items, cik, profile, rng, per_share)
+        if new_items is None:
+            continue
+        if unit.startswith('USD') and profile['unit_mix'] == 'foreign':
+            unit = 'EUR' + unit[3:]
+        elif unit.startswith('USD') and profile['unit_mix'] == 'mixed' and rng.random() < 0.2:
+            # Some concepts reported in both currencies
+            result['EUR' + unit[3:]] = list(new_items)
+        result[unit] = new_items
+    return result
+
+def random_profile(rng, last_year, template_years):
+    years = rng.randint(MIN_YEARS, template_years)
+    return {
+        'first_year': last_year - years + 1,
+        'coverage': rng.uniform(0.4, 1.0),
+        'scale': 10 ** rng.uniform(-4, 0.3), # Micro caps up to above the template
+        'per_share_scale': rng.uniform(0.05, 3.0),
+        'amend_rate': rng.choice((0.0, 0.0, 0.02, 0.1)),
+        'unit_mix': rng.choice(UNIT_MIXES),
+        'extra_concepts': min(int(rng.paretovariate(1.5)) - 1, 20), # Heavy tail of very large filers
+    }
+
+def synthesize_company(template, index, rng, last_year, template_years):
+    """Returns (cik, ticker, title, companyfacts dict) for synthetic company `index`."""
+    cik = SYNTHETIC_CIK_BASE + index
+    ticker = f"SYN{index:05d}"
+    title = f"Synthetic Holdings {index} Inc."
+    profile = random_profile(rng, last_year, template_years)
+    facts = {}
+    for taxonomy, concepts in template['facts'].items():
+        out = facts[taxonomy] = {}
+        for tag, details in concepts.items():
+            if taxonomy != 'dei' and rng.random() > profile['coverage']:
+                continue
+            units = synthesize_units(details.get('units', {}), cik, profile, rng)
+            if not units:
+                continue
+            out[tag] = {'label': details.get('label'), 'description': details.get('description'), 'units': units}
+            if taxonomy == 'us-gaap':
+                for k in range(1, profile['extra_concepts'] + 1):
+                    if rng.random() < 0.5:
+                        out[f"{tag}Custom{k}"] = out[tag]
+    return cik, ticker, title, {'cik': cik, 'entityName': title, 'facts': facts}
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic SEC companyfacts payloads for offline load tests.')
+    parser.add_argument('--companies', type=int, default=1000, help='Number of synthetic companies (default: 1000).')
+    parser.add_argument('--out', default='synthetic', help='Output directory (default: synthetic).')
+    parser.add_argument('--template', default=TEMPLATE_FILE, help=f'companyfacts JSON to model companies on (default: {TEMPLATE_FILE}).')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42).')
+    parser.add_argument('--no-zip', action='store_true', help='Do not write companyfacts.zip.')
+    parser.add_argument('--archives', action='store_true', help='Also write sec_data/CIK##########.json.gz archives for --reprocess-archive.')
+    args = parser.parse_args()
+
+    template, last_year, template_years = load_template(args.template)
+    rng = random.Random(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    archive_dir = os.path.join(args.out, 'sec_data')
+    if args.archives:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    tickers = {}
+    sizes = []
+    zf = None if args.no_zip else zipfile.ZipFile(os.path.join(args.out, 'companyfacts.zip'), 'w', zipfile.ZIP_DEFLATED)
+    try:
+        for i in range(1, args.companies + 1):
+            cik, ticker, title, company = synthesize_company(template, i, rng, last_year, template_years)
+            payload = json.dumps(company, separators=(',', ':')).encode('utf-8')
+            sizes.append(len(payload))
+            if zf:
+                zf.writestr(f"CIK{cik:010d}.json", payload)
+            if args.archives:
+                with gzip.open(os.path.join(archive_dir, f"CIK{cik:010d}.json.gz"), 'wb') as f:
+                    f.write(payload)
+            tickers[str(i - 1)] = {'cik_str': cik, 'ticker': ticker, 'title': title}
+            if i % 1000 == 0:
+                print(f"Generated {i}/{args.companies} companies...")
+    finally:
+        if zf:
+            zf.close()
+
+    with open(os.path.join(args.out, 'company_tickers.json'), 'w', encoding='utf-8') as f:
+        json.dump(tickers, f)
+
+    sizes.sort()
+    if sizes:
+        mb = 1024 * 1024
+        print(f"Generated {len(sizes)} companies in {args.out}: {sum(sizes) / mb:.1f} MB uncompressed, "
+              f"median {sizes[len(sizes) // 2] / mb:.2f} MB, max {sizes[-1] / mb:.2f} MB.")
+
+if __name__ == "__main__":
+    main()
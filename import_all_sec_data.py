@@ -2,17 +2,30 @@ import json
 import requests
 import time
 import os
-import gzip
-import shutil
 import mariadb
 import logging
 import argparse
 import yfinance as yf
 import gc
+import collections
+import contextlib
+import datetime
+import email.utils
+import functools
+import itertools
+import math
+import queue
+import re
+import threading
+import tempfile
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 try:
     import psutil
 except ImportError:
     psutil = None
+from sec_archive import (ArchiveCodec, archive_path, decompress_archive, find_archive, latest_dictionary,
+                         list_archives, remove_other_archives, write_file_atomic)
 
 # --- Configuration ---
 # Database credentials
@@ -29,6 +42,63 @@ HEADERS = {'User-Agent': SEC_USER_AGENT}
 # Directory to store raw data
 DATA_DIR = 'sec_data'
 
+# Local cache of daily closing prices, keyed by (ticker, date)
+PRICE_CACHE_FILE = os.path.join(DATA_DIR, 'price_cache.json')
+PRICE_CACHE_DAYS = 7 # Older days are dropped when the cache is saved
+PRICE_BATCH_SIZE = 200 # Tickers per yfinance download request
+
+# Per-CIK refresh state (latest accession/filed date and HTTP validators) for --refresh runs
+REFRESH_STATE_FILE = os.path.join(DATA_DIR, 'refresh_state.json')
+# SEC company list and the HTTP validators of its last download
+TICKERS_FILE = 'company_tickers.json'
+TICKERS_VALIDATORS_FILE = os.path.join(DATA_DIR, 'company_tickers_validators.json')
+SEC_COMPANIES_WIDTHS = {'ticker': 20, 'title': 255} # varchar sizes in sec_companies
+
+# Archives finished by an interrupted --reprocess-archive run
+REPROCESS_STATE_FILE = os.path.join(DATA_DIR, 'reprocess_state.json')
+
+# Cross-company batching of sec_financial_reports writes
+REPORT_BATCH_SIZE = 5000 # Rows per upsert batch / commit
+REPORT_FLUSH_INTERVAL = 30 # Seconds before a partially filled batch is flushed anyway
+
+# End-of-run JSON report with per-stage timings (see ImportMetrics)
+METRICS_SUMMARY_FILE = os.path.join(DATA_DIR, 'import_run_summary.json')
+METRICS_SLOWEST_TICKERS = 20 # Tickers listed in the summary's slowest_tickers
+
+# Schema validation of sec_financial_reports rows (see RowValidator)
+# Fallback DDL (shipped next to this script) when SHOW CREATE TABLE is unavailable
+SCHEMA_DDL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables.sql')
+REJECTS_TABLE = 'sec_financial_report_rejects'
+
+# Companies whose parsed rows may wait for the single DB writer thread
+PIPELINE_QUEUE_SIZE = 64
+
+# Background compression of raw payloads into DATA_DIR (see ArchiveWriter and sec_archive.py)
+ARCHIVE_WORKERS = 2
+ARCHIVE_MAX_PENDING = 4 # Raw payloads waiting to be compressed (bounds memory held by the archiver)
+
+# SEC allows 10 requests/second per client; stay safely below that across all threads
+SEC_MAX_REQUESTS_PER_SECOND = 8
+
+# Shared reaction to SEC push-back (see ThrottleController)
+THROTTLE_STATUSES = (403, 429) # The SEC answers 403 when the request rate threshold is exceeded
+THROTTLE_PAUSE_SECONDS = 10 # First global pause; doubles with every consecutive push-back
+THROTTLE_MAX_PAUSE_SECONDS = 600
+THROTTLE_MIN_REQUESTS_PER_SECOND = 1 # Push-back halves the request rate down to this floor
+THROTTLE_RECOVERY_SECONDS = 30 # Quiet period after which the rate is raised again
+THROTTLE_RECOVERY_STEP = 1 # Requests/second added per recovery step
+CIRCUIT_FAILURE_THRESHOLD = 5 # Consecutive failed requests (any thread) that open the circuit
+CIRCUIT_OPEN_SECONDS = 60 # First time the circuit stays open; doubles each time a probe fails
+CIRCUIT_MAX_OPEN_SECONDS = 900
+
+# Shared HTTP session: kept-alive connections per SEC host (www.sec.gov, data.sec.gov)
+SEC_POOL_HOSTS = 2
+SEC_POOL_CONNECTIONS_PER_HOST = 1 # Raised to --workers at startup
+
+# Pooled DB connections (writer thread, rederive reader, spare)
+DB_POOL_SIZE = 4
+DB_POOL_VALIDATION_MS = 500 # The pool pings a connection idle for longer than this before handing it out
+
 # --- Logging Setup ---
 LOG_FILE = 'etl.log'
 logging.basicConfig(
@@ -110,40 +180,679 @@ METRIC_MAP = {
     'shell_company_flag': 'EntityShellCompany',
 }
 
-def get_db_connection():
-    """Establishes and returns a database connection."""
+# --- Compiled Metric Plan ---
+# METRIC_MAP is compiled once at import time so per-company evaluation does no isinstance dispatch.
+
+# Columns set for every annual record before METRIC_MAP columns
+REPORT_KEY_COLUMNS = ['cik', 'fiscal_year', 'filing_date', 'form', 'price']
+ANNUAL_UNITS = ('USD', 'USD/shares', 'shares')
+# Fields we warn about when no tag matched
+CRITICAL_FIELDS = ['revenue', 'net_income', 'operating_cash_flow', 'eps']
+
+class MetricPlan:
+    """Execution plan compiled from a METRIC_MAP-style mapping.
+
+    Attributes:
+        columns:   Output column order (REPORT_KEY_COLUMNS followed by the map's keys).
+        direct:    List of (column, tags) where tags is the ordered fallback tuple of us-gaap tags.
+        tag_index: Reverse index {tag: [(column, priority), ...]}; priority 0 is the preferred tag.
+        derived:   Topologically ordered list of (column, formula, only_if_missing). Fallback
+                   formulas (last element of a tag list) only run when no tag matched.
+    """
+
+    def __init__(self, columns, direct, tag_index, derived):
+        self.columns = columns
+        self.direct = direct
+        self.tag_index = tag_index
+        self.derived = derived
+
+def formula_dependencies(formula, names):
+    """Returns the metric names a formula reads, taken from the string constants in its code."""
+    return {c for c in formula.__code__.co_consts if isinstance(c, str) and c in names}
+
+def compile_metric_plan(metric_map):
+    """Compiles a METRIC_MAP-style mapping into a MetricPlan.
+
+    Raises ValueError if derived formulas depend on each other cyclically.
+    """
+    names = set(metric_map) | set(REPORT_KEY_COLUMNS)
+    direct = []
+    tag_index = {}
+    formulas = {}
+    for name, logic in metric_map.items():
+        entries = logic if isinstance(logic, list) else [logic]
+        tags = tuple(t for t in entries if isinstance(t, str))
+        if tags:
+            direct.append((name, tags))
+            for priority, tag in enumerate(tags):
+                tag_index.setdefault(tag, []).append((name, priority))
+        if entries and callable(entries[-1]):
+            formulas[name] = (entries[-1], bool(tags))
+
+    # Kahn's algorithm, keeping METRIC_MAP order among formulas that are ready together
+    deps = {name: formula_dependencies(fn, names) & set(formulas) - {name} for name, (fn, _) in formulas.items()}
+    derived = []
+    done = set()
+    while len(derived) < len(formulas):
+        ready = [n for n in formulas if n not in done and deps[n] <= done]
+        if not ready:
+            raise ValueError(f"Cyclic METRIC_MAP formulas: {sorted(set(formulas) - done)}")
+        for name in ready:
+            fn, only_if_missing = formulas[name]
+            derived.append((name, fn, only_if_missing))
+            done.add(name)
+
+    return MetricPlan(REPORT_KEY_COLUMNS + list(metric_map), direct, tag_index, derived)
+
+METRIC_PLAN = compile_metric_plan(METRIC_MAP)
+
+def evaluate_metric_plan(plan, metrics_data, record):
+    """Fills `record` in place from a {tag: value} dict using a compiled MetricPlan."""
+    for name, tags in plan.direct:
+        for tag in tags:
+            if tag in metrics_data:
+                record[name] = metrics_data[tag]
+                break
+    for name, formula, only_if_missing in plan.derived:
+        if only_if_missing and record[name] is not None:
+            continue
+        try:
+            record[name] = formula(record)
+        except (TypeError, ZeroDivisionError):
+            record[name] = None
+    return record
+
+def filing_rank(item):
+    """Sort key preferring original (non-/A) filings, then the earliest filed, for a fiscal year's filing_date/form."""
+    form = item.get('form') or ''
+    return (form.endswith('/A'), item.get('filed') or '', form)
+
+def extract_annual_facts(company_data, cik, plan=METRIC_PLAN):
+    """Groups a company's annual (fp == 'FY') us-gaap facts by fiscal year.
+
+    Returns {year: {'cik', 'fiscal_year', 'filing_date', 'form', 'temp_metrics'}} where
+    temp_metrics only holds tags referenced by the plan. Only those tags are read, and
+    filing_date/form come from the year's earliest original filing (filing_rank), so
+    the result does not depend on concept order or on whether the payload was parsed
+    in full or with parse_selected_facts.
+    """
+    data_by_year = {}
+    tag_index = plan.tag_index
+    for metric, details in company_data.get('facts', {}).get('us-gaap', {}).items():
+        if metric not in tag_index:
+            continue
+        units = details.get('units', {})
+        for unit in ANNUAL_UNITS:
+            if unit not in units:
+                continue
+            for item in units[unit]:
+                if item.get('fp') != 'FY' or 'form' not in item: # Focusing on 10-K/Annual data
+                    continue
+                # Using the year from 'end' date is more robust than 'fy' as 'fy' often
+                # refers to the report year rather than the period year.
+                year = int(item.get('end', '').split('-')[0]) if item.get('end') else item.get('fy')
+                if not year:
+                    continue
+                year_data = data_by_year.get(year)
+                if year_data is None:
+                    year_data = data_by_year[year] = {
+                        'cik': str(cik).zfill(10),
+                        'fiscal_year': year,
+                        'filing_date': item.get('filed'),
+                        'form': item.get('form'),
+                        'rank': filing_rank(item),
+                        'temp_metrics': {}
+                    }
+                elif filing_rank(item) < year_data['rank']:
+                    year_data.update(filing_date=item.get('filed'), form=item.get('form'), rank=filing_rank(item))
+                # If multiple filings report the same year we overwrite, so the last one wins.
+                year_data['temp_metrics'][metric] = item['val']
+    for year_data in data_by_year.values():
+        del year_data['rank']
+    return data_by_year
+
+def build_annual_records(company_data, cik, price, plan=METRIC_PLAN):
+    """Builds one sec_financial_reports record per fiscal year, keyed by plan.columns."""
+    records = []
+    for year, year_data in extract_annual_facts(company_data, cik, plan).items():
+        record = dict.fromkeys(plan.columns)
+        record['cik'] = year_data['cik']
+        record['fiscal_year'] = year_data['fiscal_year']
+        record['filing_date'] = year_data['filing_date']
+        record['form'] = year_data['form']
+        record['price'] = price
+        records.append(evaluate_metric_plan(plan, year_data['temp_metrics'], record))
+    return records
+
+# --- Quarterly Facts ---
+# 10-Q facts mix 3-month and year-to-date durations, so quarters are de-cumulated
+# by differencing periods that share a start date (Q4 falls out as FY minus 9M).
+
+QUARTERLY_TABLE = 'sec_quarterly_reports'
+QUARTERLY_METRICS = [
+    'revenue', 'cost_of_revenue', 'gross_profit', 'operating_income', 'net_income', 'eps',
+    'interest_expense', 'operating_cash_flow', 'capital_expenditures',
+    'total_assets', 'total_liabilities', 'shareholders_equity', 'cash_and_equivalents', 'long_term_debt',
+]
+QUARTERLY_COLUMNS = ['cik', 'fiscal_year', 'fiscal_quarter', 'period_end', 'form', 'filing_date'] + QUARTERLY_METRICS
+QUARTER_DAYS = (80, 100)
+ANNUAL_DAYS = (350, 380)
+
+def collect_periods(units):
+    """Returns ({(start, end): item}, {end: item}) for a tag's duration and instant facts; later filings win."""
+    durations = {}
+    instants = {}
+    for unit in ANNUAL_UNITS:
+        for item in units.get(unit, ()):
+            if 'form' not in item or 'end' not in item:
+                continue
+            try:
+                end = datetime.date.fromisoformat(item['end'])
+                start = datetime.date.fromisoformat(item['start']) if 'start' in item else None
+            except ValueError:
+                continue
+            if start is None:
+                instants[end] = item
+            else:
+                durations[(start, end)] = item
+    return durations, instants
+
+def decumulate_quarters(durations):
+    """Turns duration facts into {quarter_end: (value, item)}.
+
+    Reported 3-month periods are used as-is; every longer period is reduced by the
+    period with the same start that ends one quarter earlier (6M - 3M, 9M - 6M, FY - 9M). Per-share values derived this way are approximations.
+    """
+    quarters = {}
+    ends_by_start = {}
+    for (start, end), item in durations.items():
+        if QUARTER_DAYS[0] <= (end - start).days <= QUARTER_DAYS[1]:
+            quarters[end] = (item['val'], item)
+        ends_by_start.setdefault(start, []).append(end)
+    for start, ends in ends_by_start.items():
+        ends.sort()
+        for prev, end in zip(ends, ends[1:]):
+            if end not in quarters and QUARTER_DAYS[0] <= (end - prev).days <= QUARTER_DAYS[1]:
+                item = durations[(start, end)]
+                quarters[end] = (item['val'] - durations[(start, prev)]['val'], item)
+    return quarters
+
+def fiscal_quarter_of(end, fiscal_years):
+    """Labels a quarter end with (fiscal_year, fiscal_quarter) given sorted (start, end) fiscal years.
+
+    Fiscal years are named after the year of their end date, like the annual table.
+    Quarters after the latest reported fiscal year are placed in the following one.
+    """
+    for fy_start, fy_end in fiscal_years:
+        if fy_start < end <= fy_end:
+            return fy_end.year, min(4, max(1, round((end - fy_start).days / 91.3)))
+    if fiscal_years and end > fiscal_years[-1][1]:
+        days = (end - fiscal_years[-1][1]).days
+        if days <= ANNUAL_DAYS[1]:
+            return fiscal_years[-1][1].year + 1, min(4, max(1, round(days / 91.3)))
+    return None
+
+def build_quarterly_records(company_data, cik, plan=METRIC_PLAN):
+    """Builds de-cumulated sec_quarterly_reports records (Q1-Q4) keyed by QUARTERLY_COLUMNS.
+
+    Uses the same fallback tag order as the annual plan; balance-sheet (instant) values
+    are taken at each quarter end.
+    """
+    gaap = company_data.get('facts', {}).get('us-gaap', {})
+    tags_by_column = dict(plan.direct)
+    flows = {} # {column: {quarter_end: (value, item)}}
+    balances = {} # {column: {end: item}}
+    fiscal_years = set()
+    for col in QUARTERLY_METRICS:
+        for tag in tags_by_column.get(col, ()):
+            if tag not in gaap:
+                continue
+            durations, instants = collect_periods(gaap[tag].get('units', {}))
+            for start, end in durations:
+                if ANNUAL_DAYS[0] <= (end - start).days <= ANNUAL_DAYS[1]:
+                    fiscal_years.add((start, end))
+            for end, value in decumulate_quarters(durations).items():
+                flows.setdefault(col, {}).setdefault(end, value)
+            for end, item in instants.items():
+                balances.setdefault(col, {}).setdefault(end, item)
+    fiscal_years = sorted(fiscal_years, key=lambda p: p[1])
+
+    records = {}
+    for col, quarters in flows.items():
+        for end, (value, item) in quarters.items():
+            label = fiscal_quarter_of(end, fiscal_years)
+            if label is None:
+                continue
+            record = records.get(end)
+            if record is None:
+                record = records[end] = dict.fromkeys(QUARTERLY_COLUMNS)
+                record.update(cik=str(cik).zfill(10), fiscal_year=label[0], fiscal_quarter=label[1],
+                              period_end=end.isoformat(), form=item.get('form'), filing_date=item.get('filed'))
+            record[col] = value
+    for col, by_end in balances.items():
+        for end, item in by_end.items():
+            if end in records:
+                records[end][col] = item['val']
+    # 52/53-week calendars can label two ends alike; keep the later one
+    return list({(r['fiscal_year'], r['fiscal_quarter']): r for _, r in sorted(records.items())}.values())
+
+# --- Fact Store ---
+# Every fact is kept in a narrow table so METRIC_MAP changes can be re-applied
+# (--rederive) without downloading companyfacts again.
+
+FACTS_TABLE = 'sec_facts'
+FACT_COLUMNS = ['cik', 'taxonomy', 'tag', 'unit', 'fy', 'fp', 'start', 'end', 'val', 'accn', 'form', 'filed']
+# Item fields restored when sec_facts rows are turned back into companyfacts items
+FACT_ITEM_FIELDS = ('fy', 'fp', 'start', 'end', 'val', 'accn', 'form', 'filed')
+
+def build_fact_rows(company_data, cik):
+    """Flattens every fact of a companyfacts payload into FACT_COLUMNS row tuples, in payload order."""
+    cik = str(cik).zfill(10)
+    rows = []
+    for taxonomy, tags in company_data.get('facts', {}).items():
+        for tag, details in tags.items():
+            for unit, items in details.get('units', {}).items():
+                for item in items:
+                    if 'val' not in item:
+                        continue
+                    rows.append((cik, taxonomy, tag, unit, item.get('fy'), item.get('fp'), item.get('start'),
+                                 item.get('end'), item['val'], item.get('accn'), item.get('form'), item.get('filed')))
+    return rows
+
+def fact_item(row):
+    """Turns a sec_facts (fy, fp, start, end, val, accn, form, filed) row back into a companyfacts item."""
+    item = {}
+    for field, v in zip(FACT_ITEM_FIELDS, row):
+        if v is None:
+            continue
+        if isinstance(v, datetime.date):
+            v = v.isoformat()
+        elif field == 'val' and isinstance(v, float) and v.is_integer():
+            v = int(v) # JSON integers come back from the double column as floats
+        item[field] = v
+    return item
+
+db_pools = {} # {local_infile: mariadb.ConnectionPool}
+db_pools_lock = threading.Lock()
+
+def get_db_pool(local_infile=False):
+    """Returns the process-wide connection pool, creating it on first use.
+
+    Connections with and without LOAD DATA LOCAL INFILE come from separate pools.
+    """
+    with db_pools_lock:
+        pool = db_pools.get(local_infile)
+        if pool is None:
+            pool = db_pools[local_infile] = mariadb.ConnectionPool(
+                pool_name=f"sec_import{'_infile' if local_infile else ''}",
+                pool_size=DB_POOL_SIZE,
+                pool_validation_interval=DB_POOL_VALIDATION_MS,
+                host=DB_HOST,
+                port=DB_PORT,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                database=DB_NAME,
+                local_infile=local_infile
+            )
+        return pool
+
+def get_db_connection(local_infile=False):
+    """Returns a pooled database connection; close() hands it back to the pool.
+
+    `local_infile` enables LOAD DATA LOCAL INFILE on the connection.
+    """
     try:
-        conn = mariadb.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return conn
+        return get_db_pool(local_infile).get_connection()
     except mariadb.Error as e:
         logging.error(f"Error connecting to MariaDB Platform: {e}")
         return None
 
-def request_with_retry(url, headers=None, max_retries=5, backoff_factor=2):
-    """Performs a GET request with exponential backoff on failure."""
+def healthy_connection(conn, local_infile=False):
+    """Returns conn if it answers a ping, otherwise a fresh pooled connection (None if that fails too)."""
+    if conn is not None:
+        try:
+            conn.ping()
+            return conn
+        except mariadb.Error as e:
+            logging.warning(f"Database connection failed its health check ({e}). Reconnecting...")
+            with contextlib.suppress(mariadb.Error):
+                conn.close()
+    metrics.incr('db_reconnects')
+    return get_db_connection(local_infile=local_infile)
+
+def close_db_pools():
+    """Closes every pooled connection."""
+    with db_pools_lock:
+        for pool in db_pools.values():
+            with contextlib.suppress(mariadb.Error):
+                pool.close()
+        db_pools.clear()
+
+# --- Run Metrics ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+class ImportMetrics:
+    """Thread-safe stage timings and live counters for one import run.
+
+    Durations are recorded per ticker for the download, parse, derive and compress
+    stages, and per batch for the batched price and insert stages. `counters` can be
+    read at any time via snapshot(); write_summary() produces the end-of-run report.
+    """
+
+    STAGES = ('download', 'price', 'parse', 'derive', 'insert', 'compress')
+    TICKER_STAGES = ('download', 'parse', 'derive', 'compress')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.durations = {stage: [] for stage in self.STAGES} # {stage: [(seconds, key)]}
+        self.counters = collections.Counter()
+        self.tickers = {} # {ticker: {'seconds': {stage: s}, 'bytes': n, 'retries': n}}
+
+    def ticker_entry(self, ticker):
+        return self.tickers.setdefault(ticker, {'seconds': {}, 'bytes': 0, 'retries': 0})
+
+    def record(self, stage, key, seconds, nbytes=0):
+        """Records one stage duration; `key` is the ticker, or a batch label for batched stages."""
+        with self.lock:
+            self.durations[stage].append((seconds, key))
+            if stage in self.TICKER_STAGES and key:
+                entry = self.ticker_entry(key)
+                entry['seconds'][stage] = entry['seconds'].get(stage, 0.0) + seconds
+                entry['bytes'] += nbytes
+
+    @contextlib.contextmanager
+    def timed(self, stage, key):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, key, time.monotonic() - start)
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def count_retry(self, ticker=None):
+        with self.lock:
+            self.counters['http_retries'] += 1
+            if ticker:
+                self.ticker_entry(ticker)['retries'] += 1
+
+    def snapshot(self):
+        """Returns the live counters plus elapsed seconds."""
+        with self.lock:
+            snap = dict(self.counters)
+        snap['elapsed_seconds'] = round(time.time() - self.started, 1)
+        return snap
+
+    def summary(self):
+        """Builds the run report: counters, per-stage percentiles and the slowest tickers."""
+        with self.lock:
+            stages = {}
+            for stage, entries in self.durations.items():
+                values = sorted(sec for sec, _ in entries)
+                stages[stage] = {
+                    'count': len(values),
+                    'total_seconds': round(sum(values), 3),
+                    'p50': percentile(values, 50),
+                    'p90': percentile(values, 90),
+                    'p99': percentile(values, 99),
+                    'max': values[-1] if values else None,
+                }
+            slowest = sorted(self.tickers.items(), key=lambda kv: sum(kv[1]['seconds'].values()), reverse=True)
+            slowest_tickers = [
+                {'ticker': ticker, 'total_seconds': round(sum(e['seconds'].values()), 3),
+                 'seconds': {k: round(v, 3) for k, v in e['seconds'].items()},
+                 'bytes': e['bytes'], 'retries': e['retries']}
+                for ticker, e in slowest[:METRICS_SLOWEST_TICKERS]
+            ]
+            counters = dict(self.counters)
+
+        summary = {
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'elapsed_seconds': round(time.time() - self.started, 1),
+            'counters': counters,
+            'stages': stages,
+            'slowest_tickers': slowest_tickers,
+        }
+        if psutil:
+            summary['rss_mb'] = round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+        return summary
+
+    def write_summary(self, path=METRICS_SUMMARY_FILE):
+        write_json_atomic(path, self.summary())
+        logging.info(f"Wrote import run summary to {path}")
+
+# Process-wide metrics for the current run
+metrics = ImportMetrics()
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every SEC request made by this process."""
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.timestamp = clock()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = float(rate)
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+                self.timestamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+class ThrottleController:
+    """Request pacing and push-back handling shared by every thread talking to the SEC.
+
+    Call acquire() before each request and then exactly one of record_success(),
+    record_pushback() (403/429) or record_failure() (other errors).
+
+    * Push-back pauses all threads (Retry-After, or THROTTLE_PAUSE_SECONDS doubling per
+      consecutive push-back) and halves the request rate. After THROTTLE_RECOVERY_SECONDS
+      without push-back the rate rises by THROTTLE_RECOVERY_STEP per success up to max_rate.
+    * CIRCUIT_FAILURE_THRESHOLD consecutive failures open the circuit: every thread waits
+      for the open period, then a single probe request is let through. Success closes
+      the circuit; failure re-opens it for twice as long.
+
+    Time threads spend waiting on a pause or open circuit is counted in `metrics`
+    (throttled_seconds), with throttle_pauses and circuit_trips. `clock` and `sleep`
+    can be replaced, e.g. by a fake clock in tests.
+    """
+
+    PROBE_POLL_SECONDS = 0.5
+
+    def __init__(self, max_rate=SEC_MAX_REQUESTS_PER_SECOND, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = float(max_rate)
+        self.rate = self.max_rate
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(self.max_rate, clock=clock, sleep=sleep)
+        self.lock = threading.Lock()
+        self.pause_until = 0.0
+        self.consecutive_pushbacks = 0
+        self.consecutive_failures = 0
+        self.last_pushback = 0.0
+        self.last_recovery = 0.0
+        self.state = 'closed' # closed -> open -> half_open -> closed (or open again)
+        self.open_until = 0.0
+        self.open_seconds = CIRCUIT_OPEN_SECONDS
+        self.probe_in_flight = False
+
+    def blocked_for(self, now):
+        """Seconds the calling thread must still wait; 0 lets it send (lock held)."""
+        if self.state == 'open':
+            if now < self.open_until:
+                return self.open_until - now
+            self.state = 'half_open'
+            self.probe_in_flight = False
+            logging.info("SEC circuit half-open: sending a probe request.")
+        if self.state == 'half_open' and self.probe_in_flight:
+            return self.PROBE_POLL_SECONDS
+        if now < self.pause_until:
+            return self.pause_until - now
+        if self.state == 'half_open':
+            self.probe_in_flight = True
+        return 0
+
+    def acquire(self):
+        """Blocks while requests are paused or the circuit is open, then takes a rate token."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                wait = self.blocked_for(self.clock())
+            if wait <= 0:
+                break
+            self.sleep(wait)
+            waited += wait
+        if waited:
+            metrics.incr('throttled_seconds', round(waited, 3))
+        self.bucket.acquire()
+
+    def record_success(self):
+        with self.lock:
+            now = self.clock()
+            self.consecutive_failures = 0
+            self.consecutive_pushbacks = 0
+            if self.state == 'half_open':
+                self.state = 'closed'
+                self.open_seconds = CIRCUIT_OPEN_SECONDS
+                logging.info("SEC circuit closed: probe request succeeded.")
+            quiet_since = max(self.last_pushback, self.last_recovery)
+            if self.rate < self.max_rate and now - quiet_since >= THROTTLE_RECOVERY_SECONDS:
+                self.set_rate(min(self.max_rate, self.rate + THROTTLE_RECOVERY_STEP))
+                self.last_recovery = now
+
+    def record_pushback(self, status, retry_after=None):
+        """Pauses every thread after a 403/429; retry_after is the server's hint in seconds."""
+        with self.lock:
+            now = self.clock()
+            self.consecutive_pushbacks += 1
+            self.last_pushback = now
+            pause = min(THROTTLE_MAX_PAUSE_SECONDS, THROTTLE_PAUSE_SECONDS * 2 ** (self.consecutive_pushbacks - 1))
+            pause = max(pause, retry_after or 0)
+            self.pause_until = max(self.pause_until, now + pause)
+            self.set_rate(max(THROTTLE_MIN_REQUESTS_PER_SECOND, self.rate / 2))
+            logging.warning(f"SEC push-back (HTTP {status}): pausing all requests for {pause:.0f}s, "
+                            f"rate lowered to {self.rate:.1f} req/s.")
+            self.fail(now)
+        metrics.incr('throttle_pauses')
+
+    def record_failure(self):
+        with self.lock:
+            self.fail(self.clock())
+
+    def fail(self, now):
+        """Counts a failed request and opens the circuit when due (lock held)."""
+        self.consecutive_failures += 1
+        if self.state == 'half_open' or (self.state == 'closed' and self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD):
+            self.state = 'open'
+            self.open_until = now + self.open_seconds
+            logging.error(f"SEC circuit open after {self.consecutive_failures} consecutive failures: "
+                          f"holding all requests for {self.open_seconds}s.")
+            self.open_seconds = min(CIRCUIT_MAX_OPEN_SECONDS, self.open_seconds * 2)
+            metrics.incr('circuit_trips')
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.bucket.set_rate(rate)
+
+    def snapshot(self):
+        with self.lock:
+            return {'state': self.state, 'requests_per_second': self.rate,
+                    'paused_seconds_left': round(max(0.0, self.pause_until - self.clock()), 1)}
+
+def retry_after_seconds(response):
+    """Parses a Retry-After header (seconds or HTTP date) into seconds, or None."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+# Process-wide SEC throttle (the bucket's capacity 1 keeps requests evenly spaced, no bursts)
+sec_throttle = ThrottleController(SEC_MAX_REQUESTS_PER_SECOND)
+
+def make_sec_adapter(connections_per_host):
+    """HTTP adapter keeping up to `connections_per_host` connections alive per SEC host.
+
+    pool_block makes extra threads wait for a free connection instead of opening more.
+    """
+    return requests.adapters.HTTPAdapter(pool_connections=SEC_POOL_HOSTS, pool_maxsize=connections_per_host,
+                                         pool_block=True)
+
+def make_sec_session(connections_per_host=SEC_POOL_CONNECTIONS_PER_HOST):
+    """Session shared by every SEC request, so downloads reuse TCP/TLS connections."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    session.mount('https://', make_sec_adapter(connections_per_host))
+    return session
+
+sec_session = make_sec_session()
+
+def request_with_retry(url, headers=None, max_retries=5, backoff_factor=2, ticker=None):
+    """Performs a GET request through `sec_throttle`, retrying failures.
+
+    403/429 responses pause every thread via the throttle rather than just this one;
+    other errors are retried after a local exponential backoff. Retries are counted
+    in `metrics`, attributed to `ticker` when given.
+    """
     for i in range(max_retries):
+        if i > 0:
+            metrics.count_retry(ticker)
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            sec_throttle.acquire()
+            response = sec_session.get(url, headers=headers, timeout=30)
             response.raise_for_status()
+            sec_throttle.record_success()
             return response
         except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
+            status = e.response.status_code
+            if status == 404:
+                sec_throttle.record_success() # The server is answering normally
                 logging.warning(f"Data not found (404) for {url}. Skipping.")
                 raise e # Raise to be caught by the caller who handles the retry
-            
+
+            if status in THROTTLE_STATUSES:
+                sec_throttle.record_pushback(status, retry_after_seconds(e.response))
+                wait = 0 # The next acquire() waits out the shared pause
+            else:
+                sec_throttle.record_failure()
+                wait = backoff_factor ** i
             if i == max_retries - 1:
                 logging.error(f"Failed to fetch {url} after {max_retries} attempts.")
                 raise e
-            wait = backoff_factor ** i
-            logging.warning(f"HTTP error {e.response.status_code}: {e}. Retrying in {wait}s... ({i+1}/{max_retries})")
-            time.sleep(wait)
+            if wait:
+                logging.warning(f"HTTP error {status}: {e}. Retrying in {wait}s... ({i+1}/{max_retries})")
+                time.sleep(wait)
         except (requests.exceptions.RequestException, Exception) as e:
+            sec_throttle.record_failure()
             if i == max_retries - 1:
                 logging.error(f"Failed to fetch {url} after {max_retries} attempts.")
                 raise e
@@ -151,237 +860,1299 @@ def request_with_retry(url, headers=None, max_retries=5, backoff_factor=2):
             logging.warning(f"Network error: {e}. Retrying in {wait}s... ({i+1}/{max_retries})")
             time.sleep(wait)
 
-def get_stock_price(ticker):
-    """Fetches the current stock price for a given ticker with retries."""
-    if not ticker:
-        return None
-    for attempt in range(3):
+def write_json_atomic(path, obj):
+    """Writes obj as JSON to path via a temp file and rename."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+class PriceCache:
+    """Daily closing prices keyed by (ticker, date), persisted as JSON in PRICE_CACHE_FILE.
+
+    `day` (default: the date the cache is created) is fixed for the cache's lifetime,
+    so a run that passes midnight keeps reading the prices it fetched at the start.
+    """
+
+    def __init__(self, path=PRICE_CACHE_FILE, day=None):
+        self.path = path
+        self.day = day or datetime.date.today().isoformat()
+        self.prices = {} # {'YYYY-MM-DD': {ticker: price}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.prices = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable price cache {path}: {e}")
+
+    def get(self, ticker, day=None):
+        return self.prices.get(day or self.day, {}).get(ticker)
+
+    def put(self, ticker, price, day=None):
+        self.prices.setdefault(day or self.day, {})[ticker] = price
+
+    def missing(self, tickers, day=None):
+        """Returns the tickers with no cached price for `day` (default the cache's day)."""
+        cached = self.prices.get(day or self.day, {})
+        return [t for t in tickers if t not in cached]
+
+    def save(self):
+        """Writes the cache atomically, keeping only the most recent PRICE_CACHE_DAYS days."""
+        for day in sorted(self.prices)[:-PRICE_CACHE_DAYS]:
+            del self.prices[day]
+        write_json_atomic(self.path, self.prices)
+
+def fetch_prices_batched(tickers, price_cache):
+    """Fills price_cache with the latest closing prices, under its day, for tickers not already cached.
+
+    Prices are fetched PRICE_BATCH_SIZE tickers at a time with a single yf.download
+    call per batch. Tickers yfinance has no price for are left out of the cache.
+    """
+    tickers = sorted({t for t in tickers if t})
+    to_fetch = price_cache.missing(tickers)
+    logging.info(f"Price stage: {len(tickers) - len(to_fetch)} cached, {len(to_fetch)} to fetch.")
+
+    for start in range(0, len(to_fetch), PRICE_BATCH_SIZE):
+        batch = to_fetch[start:start + PRICE_BATCH_SIZE]
         try:
-            stock = yf.Ticker(ticker)
-            # Try to get fast info first
-            price = stock.info.get('regularMarketPrice') or stock.info.get('currentPrice')
-            if price:
-                logging.info(f"Fetched price for {ticker}: {price}")
-                return float(price)
-            
-            # Fallback to history
-            hist = stock.history(period="2d")
-            if not hist.empty:
-                val = float(hist['Close'].iloc[-1])
-                logging.info(f"Fetched price for {ticker} from history: {val}")
-                return val
+            with metrics.timed('price', f"batch{start // PRICE_BATCH_SIZE + 1}"):
+                data = yf.download(batch, period='5d', interval='1d', auto_adjust=False,
+                                   progress=False, threads=True)
         except Exception as e:
-            logging.warning(f"Attempt {attempt+1} failed to fetch price for {ticker}: {e}")
-            time.sleep(2)
-    return None
+            logging.warning(f"Batch price download failed for {len(batch)} tickers: {e}")
+            continue
+        if data is None or data.empty:
+            continue
+
+        closes = data['Close']
+        if not hasattr(closes, 'columns'): # Single-ticker downloads return a Series
+            closes = closes.to_frame(name=batch[0])
+        for ticker in batch:
+            if ticker not in closes.columns:
+                continue
+            series = closes[ticker].dropna()
+            if not series.empty:
+                price_cache.put(ticker, float(series.iloc[-1]))
+                metrics.incr('prices_fetched')
+        logging.info(f"Fetched prices for batch {start // PRICE_BATCH_SIZE + 1} ({len(batch)} tickers).")
+
+    price_cache.save()
+    return price_cache
+
+class RefreshState:
+    """Per-CIK record of what was last imported, persisted as JSON in REFRESH_STATE_FILE.
+
+    Each entry holds the latest filing accession number and filed date seen in the
+    company's facts plus the HTTP ETag/Last-Modified validators of that response.
+    """
+
+    def __init__(self, path=REFRESH_STATE_FILE):
+        self.path = path
+        self.entries = {} # {cik: {'accn', 'filed', 'etag', 'last_modified'}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable refresh state {path}: {e}")
+
+    def get(self, cik):
+        return self.entries.get(cik, {})
+
+    def update(self, cik, **fields):
+        self.entries.setdefault(cik, {}).update({k: v for k, v in fields.items() if v is not None})
+
+    def save(self):
+        write_json_atomic(self.path, self.entries)
+
+def latest_filing(company_data):
+    """Returns (filed, accn) of the most recent filing referenced by any fact, or (None, None)."""
+    latest = (None, None)
+    for taxonomy in company_data.get('facts', {}).values():
+        for details in taxonomy.values():
+            for items in details.get('units', {}).values():
+                for item in items:
+                    filed = item.get('filed')
+                    if filed and (latest[0] is None or (filed, item.get('accn') or '') > (latest[0], latest[1] or '')):
+                        latest = (filed, item.get('accn'))
+    return latest
 
 def download_company_tickers():
-    """Downloads the main list of all company tickers and CIKs."""
+    """Downloads the main list of all company tickers and CIKs.
+
+    The ETag/Last-Modified of the last download are kept in TICKERS_VALIDATORS_FILE
+    and sent as a conditional request, so an unchanged list is not downloaded again.
+    """
     logging.info("Downloading company tickers list...")
     url = "https://www.sec.gov/files/company_tickers.json"
+    headers = {}
+    if os.path.exists(TICKERS_FILE) and os.path.exists(TICKERS_VALIDATORS_FILE):
+        try:
+            with open(TICKERS_VALIDATORS_FILE, 'r', encoding='utf-8') as f:
+                validators = json.load(f)
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable {TICKERS_VALIDATORS_FILE}: {e}")
     try:
-        response = request_with_retry(url, headers=HEADERS)
-        with open('company_tickers.json', 'w') as f:
-            json.dump(response.json(), f)
+        response = request_with_retry(url, headers=headers)
+        if response.status_code == 304:
+            logging.info(f"{TICKERS_FILE} is unchanged since the last download (304).")
+            return TICKERS_FILE
+        write_json_atomic(TICKERS_FILE, response.json())
+        write_json_atomic(TICKERS_VALIDATORS_FILE, {'etag': response.headers.get('ETag'),
+                                                    'last_modified': response.headers.get('Last-Modified')})
         logging.info("Successfully downloaded company_tickers.json")
-        return 'company_tickers.json'
+        return TICKERS_FILE
     except requests.exceptions.RequestException as e:
         logging.error(f"Failed to download company tickers: {e}")
         return None
 
 def populate_companies_table(conn, tickers_file):
-    """Populates the sec_companies table from the tickers file."""
+    """Brings the sec_companies table in line with the tickers file.
+
+    The current rows are loaded once and only new CIKs and changed tickers/titles are
+    written. When a CIK is listed more than once, the last entry wins, as before.
+    """
     logging.info("Populating sec_companies table...")
-    cursor = conn.cursor()
     with open(tickers_file, 'r', encoding='utf-8', errors='replace') as f:
         companies = json.load(f)
-    
-    company_list = [(c['cik_str'], c['ticker'], c['title']) for c in companies.values()]
-    
+
+    wanted = {}
+    for c in companies.values():
+        wanted[str(c['cik_str'])] = (c['ticker'][:SEC_COMPANIES_WIDTHS['ticker']] if c['ticker'] else c['ticker'],
+                                     c['title'][:SEC_COMPANIES_WIDTHS['title']] if c['title'] else c['title'])
+
     sql = "INSERT INTO sec_companies (cik, ticker, title) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE ticker = VALUES(ticker), title = VALUES(title)"
-    
+
+    cursor = conn.cursor()
     try:
-        cursor.executemany(sql, company_list)
+        cursor.execute("SELECT cik, ticker, title FROM sec_companies")
+        existing = {cik: (ticker, title) for cik, ticker, title in cursor.fetchall()}
+        delta = [(cik, ticker, title) for cik, (ticker, title) in wanted.items() if existing.get(cik) != (ticker, title)]
+        new = sum(1 for cik, _, _ in delta if cik not in existing)
+        if not delta:
+            logging.info(f"sec_companies is up to date ({len(wanted)} companies).")
+            return
+        cursor.executemany(sql, delta)
         conn.commit()
-        logging.info(f"Successfully populated/updated {cursor.rowcount} records in sec_companies.")
+        logging.info(f"Updated sec_companies: {new} new and {len(delta) - new} changed companies written, "
+                     f"{len(wanted) - len(delta)} unchanged.")
     except mariadb.Error as e:
         logging.error(f"Database error during company population: {e}")
     finally:
         cursor.close()
 
-def process_and_load_financials(conn, cik, ticker, file_path):
-    """Reads a company's fact file, processes it, and loads into the database."""
-    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-        company_data = json.load(f)
+def decompress_payload(raw_bytes):
+    """Returns raw_bytes, decompressed if they are a gzip or zstd archive."""
+    return decompress_archive(raw_bytes, DATA_DIR)
 
-    if 'us-gaap' not in company_data.get('facts', {}):
-        return
+def parse_company_facts(raw_bytes):
+    """Parses a raw or compressed companyfacts payload (bytes) into a dict."""
+    return json.loads(decompress_payload(raw_bytes).decode('utf-8', errors='replace'))
 
-    logging.info(f"Fetching stock price for {ticker}...")
-    current_price = get_stock_price(ticker)
-    logging.info(f"Processing metrics for {ticker}...")
+# --- Selective Parsing ---
+# Most of a companyfacts payload is concepts METRIC_MAP never reads. The SEC writes
+# each concept as "Tag":{"label":..,"description":..,"units":{..}}, so every concept
+# after the first of its taxonomy starts right after a '}},' (units and previous
+# concept closing). Those boundaries are found with a literal-prefixed regex over the
+# bytes and only wanted concepts are decoded; a '"units"' count guards the assumption.
 
-    data_by_year = {}
-    supported_units = ['USD', 'USD/shares', 'shares']
-    for metric, details in company_data.get('facts', {}).get('us-gaap', {}).items():
-        for unit in supported_units:
-            if unit in details.get('units', {}):
-                for item in details['units'][unit]:
-                    if item.get('fp') == 'FY' and 'form' in item: # Focusing on 10-K/Annual data
-                         # Using the year from 'end' date is more robust than 'fy' as 'fy' often 
-                         # refers to the report year rather than the period year.
-                         year = int(item.get('end', '').split('-')[0]) if item.get('end') else item.get('fy')
-                         if not year:
-                             continue
-                         if year not in data_by_year:
-                             data_by_year[year] = {
-                                 'cik': str(cik).zfill(10), 
-                                 'fiscal_year': year, 
-                                 'filing_date': item.get('filed'),
-                                 'form': item.get('form'),
-                                 'details': {} # Store metric values here temporarily
-                             }
-                         # Store the value. If multiple forms exist for same year, usually latest value/most recent filing is preferred. 
-                         # For simplicity in this structure, we overwrite. 
-                         # A more robust approach would sort by filing date.
-                         # Storing in a dictionary to map metric -> value for this year
-                         data_by_year[year].setdefault('temp_metrics', {})[metric] = item['val']
-
-    records_to_insert = []
-    for year, year_data_raw in data_by_year.items():
-        record = {
-            'cik': year_data_raw['cik'], 
-            'fiscal_year': year_data_raw['fiscal_year'], 
-            'filing_date': year_data_raw.get('filing_date'),
-            'form': year_data_raw.get('form'),
-            'price': current_price
-        }
-        
-        # First, get all direct values from the raw data
-        metrics_data = year_data_raw.get('temp_metrics', {})
-        for name, gaap_tags in METRIC_MAP.items():
-            if isinstance(gaap_tags, str):
-                record[name] = metrics_data.get(gaap_tags)
-            elif isinstance(gaap_tags, list):
-                for tag in gaap_tags:
-                    if isinstance(tag, str) and tag in metrics_data:
-                        record[name] = metrics_data[tag]
-                        break
-                else:
-                    if name not in record:
-                        record[name] = None
-
-        # Now, calculate the derived metrics
-        for name, logic in METRIC_MAP.items():
-            if callable(logic):
-                try:
-                    record[name] = logic(record)
-                except (TypeError, ZeroDivisionError):
-                    record[name] = None
-            elif isinstance(logic, list) and len(logic) > 0 and callable(logic[-1]):
-                if record.get(name) is None:
-                    try:
-                        record[name] = logic[-1](record)
-                    except (TypeError, ZeroDivisionError):
-                        record[name] = None
-        
-        critical_fields = ['revenue', 'net_income', 'operating_cash_flow', 'eps']
-        for field in critical_fields:
-            if record.get(field) is None:
-                logging.warning(f"Could not find any matching tag for '{field}' for {ticker} in FY{year}.")
-
-        records_to_insert.append(record)
-
-    if not records_to_insert:
-        return
+SELECTED_TAGS = frozenset(METRIC_PLAN.tag_index)
+FACTS_KEY_PATTERN = re.compile(rb'"facts"\s*:\s*\{')
+OBJECT_KEY_PATTERN = re.compile(rb'\s*"([^"\\]+)"\s*:\s*\{')
+CONCEPT_BOUNDARY_PATTERN = re.compile(rb'\}\s*\}\s*,\s*"([^"\\]+)"\s*:\s*\{')
+UNITS_KEY_PATTERN = re.compile(rb'"units"\s*:')
+FILED_PATTERN = re.compile(rb'"filed"\s*:\s*"([^"]*)"')
+ACCN_PATTERN = re.compile(rb'"accn"\s*:\s*"([^"]*)"')
+json_decoder = json.JSONDecoder()
 
-    cursor = conn.cursor()
-    
-    columns = records_to_insert[0].keys()
-    sql = f"REPLACE INTO sec_financial_reports ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
-    logging.info(f"Starting database insertion for {ticker} (using {len(records_to_insert)} records)...")
-    
-    def clean_val(v):
-        if v is None:
-            return None
-        # Convert scale-like objects or numpy types if any 
-        # (though we don't import numpy, libraries like yfinance might return them)
-        if hasattr(v, 'item'): # Handle numpy types
-            v = v.item()
-        if isinstance(v, (int, float)):
-            return v
-        if isinstance(v, bool):
-            return 1 if v else 0
-        return str(v)
-
-    values = [tuple(clean_val(rec.get(col)) for col in columns) for rec in records_to_insert]
+def concept_offsets(data):
+    """Returns [(taxonomy, tag, start)] where start is the offset of the tag's '{', in payload order.
+
+    Returns None if the payload does not have the expected layout.
+    """
+    facts = FACTS_KEY_PATTERN.search(data)
+    if not facts:
+        return None
+    concepts = []
+    taxonomy = None
+    key = OBJECT_KEY_PATTERN.match(data, facts.end())
+    # Taxonomy names are lowercase (dei, us-gaap, ...), concept names are not
+    while key:
+        name = key.group(1).decode()
+        if name[:1].islower() and name != taxonomy:
+            taxonomy = name
+            key = OBJECT_KEY_PATTERN.match(data, key.end())
+            continue
+        concepts.append((taxonomy, name, key.end() - 1))
+        key = CONCEPT_BOUNDARY_PATTERN.search(data, key.end())
+    if taxonomy is None or len(concepts) != len(UNITS_KEY_PATTERN.findall(data)):
+        return None
+    return concepts
 
+def parse_selected_facts(raw_bytes, tags=SELECTED_TAGS):
+    """Parses only the us-gaap concepts in `tags` from a (possibly compressed) payload.
+
+    Returns ({'facts': {'us-gaap': {tag: details}}}, (filed, accn)) where (filed, accn)
+    is the latest filing referenced by any fact, as latest_filing would report it.
+    Memory beyond the payload itself grows with the selected facts, not the file.
+    Payloads whose layout the byte scan does not recognise are parsed in full.
+    """
+    data = decompress_payload(raw_bytes)
+    concepts = concept_offsets(data)
+    if concepts is None:
+        company_data = json.loads(data.decode('utf-8', errors='replace'))
+        return company_data, latest_filing(company_data)
+
+    gaap = {}
+    for i, (taxonomy, tag, start) in enumerate(concepts):
+        if taxonomy != 'us-gaap' or tag not in tags:
+            continue
+        # Decode only up to the next concept; raw_decode stops at the end of this one
+        stop = concepts[i + 1][2] if i + 1 < len(concepts) else len(data)
+        gaap[tag], _ = json_decoder.raw_decode(data[start:stop].decode('utf-8', errors='replace'))
+    company_data = {'facts': {'us-gaap': gaap}} if any(t == 'us-gaap' for t, _, _ in concepts) else {'facts': {}}
+    return company_data, latest_filing_in_bytes(data)
+
+def latest_filing_in_bytes(data):
+    """Returns (filed, accn) of the most recent filing referenced in a raw payload, or (None, None)."""
+    filed = max(FILED_PATTERN.findall(data), default=None)
+    if not filed:
+        return None, None
+    accn = None
+    for match in re.finditer(rb'"filed"\s*:\s*"' + re.escape(filed) + rb'"', data):
+        # accn precedes filed inside the same fact object
+        item_start = data.rfind(b'{', 0, match.start())
+        found = ACCN_PATTERN.search(data, item_start, match.start())
+        if found and (accn is None or found.group(1) > accn):
+            accn = found.group(1)
+    return filed.decode(), (accn.decode() if accn is not None else None)
+
+def build_table_rows(company_data, cik, price, columns_by_table):
+    """Builds cleaned row tuples for each {table: columns} entry, in that table's column order.
+
+    Supports sec_financial_reports, QUARTERLY_TABLE and FACTS_TABLE. Returns
+    (rows_by_table, missing) where `missing` lists (field, fiscal_year) pairs for
+    CRITICAL_FIELDS with no value.
+    """
+    rows_by_table = {}
+    missing = []
+    has_gaap = 'us-gaap' in company_data.get('facts', {})
+    for table, columns in columns_by_table.items():
+        if table == FACTS_TABLE:
+            rows_by_table[table] = build_fact_rows(company_data, cik)
+            continue
+        if not has_gaap:
+            continue
+        if table == QUARTERLY_TABLE:
+            records = build_quarterly_records(company_data, cik)
+        else:
+            records = build_annual_records(company_data, cik, price)
+            missing = [(field, rec['fiscal_year']) for rec in records for field in CRITICAL_FIELDS if rec.get(field) is None]
+        rows_by_table[table] = [tuple(clean_db_value(rec.get(col)) for col in columns) for rec in records]
+    return rows_by_table, missing
+
+def parse_company_payload(cik_str, ticker, payload, price, columns_by_table):
+    """Parse stage of the import pipeline; runs in a worker process.
+
+    Turns a raw (or compressed) companyfacts payload into row tuples per table
+    with build_table_rows. Only METRIC_MAP tags are parsed (parse_selected_facts)
+    unless FACTS_TABLE rows are wanted, which need every fact.
+    Returns (rows_by_table, filed, accn, missing, timings) where (filed, accn) is the
+    latest filing and `timings` holds the 'parse' and 'derive' seconds for ImportMetrics.
+    """
+    start = time.monotonic()
+    if FACTS_TABLE in columns_by_table:
+        company_data = parse_company_facts(payload)
+        filed, accn = latest_filing(company_data)
+    else:
+        company_data, (filed, accn) = parse_selected_facts(payload)
+    parsed = time.monotonic()
+    rows_by_table, missing = build_table_rows(company_data, cik_str, price, columns_by_table)
+    return rows_by_table, filed, accn, missing, {'parse': parsed - start, 'derive': time.monotonic() - parsed}
+
+def clean_db_value(v):
+    """Converts a record value into a type the MariaDB connector accepts."""
+    if v is None:
+        return None
+    # Convert scale-like objects or numpy types if any 
+    # (though we don't import numpy, libraries like yfinance might return them)
+    if hasattr(v, 'item'): # Handle numpy types
+        v = v.item()
+    if isinstance(v, (int, float)):
+        return v
+    if isinstance(v, bool):
+        return 1 if v else 0
+    return str(v)
+
+def tsv_field(v):
+    """Formats a cleaned value for a LOAD DATA INFILE tab-separated file."""
+    if v is None:
+        return '\\N'
+    if isinstance(v, bool):
+        return '1' if v else '0'
+    return str(v).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+# --- Row Validation ---
+
+DDL_COLUMN_PATTERN = re.compile(r'^\s*`(\w+)`\s+(\w+)(?:\((\d+)(?:,(\d+))?\))?', re.M)
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+INTEGER_RANGES = {
+    'tinyint': (-2 ** 7, 2 ** 7 - 1),
+    'smallint': (-2 ** 15, 2 ** 15 - 1),
+    'mediumint': (-2 ** 23, 2 ** 23 - 1),
+    'int': (-2 ** 31, 2 ** 31 - 1),
+    'bigint': (-2 ** 63, 2 ** 63 - 1),
+}
+
+def parse_table_columns(ddl):
+    """Parses a CREATE TABLE statement into {column: (type, length/precision, scale)}."""
+    columns = {}
+    for name, col_type, size, scale in DDL_COLUMN_PATTERN.findall(ddl):
+        columns[name] = (col_type.lower(), int(size) if size else None, int(scale) if scale else None)
+    return columns
+
+def load_table_ddl(conn, table='sec_financial_reports', ddl_file=SCHEMA_DDL_FILE):
+    """Returns a table's DDL from the live database, or from ddl_file if that fails."""
     try:
-        cursor.executemany(sql, values)
-        conn.commit()
-        logging.info(f"Successfully imported {cursor.rowcount} annual reports for {ticker}.")
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SHOW CREATE TABLE {table}")
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        if row:
+            return row[1]
     except mariadb.Error as e:
-        logging.error(f"Bulk insert failed for {ticker}: {e}. Falling back to individual inserts for debugging.")
-        # Fallback to individual inserts to find the exact row/column issue
-        conn.rollback()
+        logging.warning(f"SHOW CREATE TABLE failed ({e}); using {ddl_file} for row validation.")
+    with open(ddl_file, 'r', encoding='utf-8') as f:
+        ddl = f.read()
+    start = ddl.index(f'CREATE TABLE `{table}`')
+    return ddl[start:ddl.index(';', start)]
+
+def to_number(v):
+    """Returns v as int/float, or None if it is not a finite number."""
+    if isinstance(v, str):
+        try:
+            v = float(v)
+        except ValueError:
+            return None
+    if isinstance(v, float) and not math.isfinite(v):
+        return None
+    return v
+
+def decimal_check(precision, scale):
+    bound = 10 ** (precision - scale)
+    def check(v):
+        n = to_number(v)
+        if n is None:
+            return None, 'not a finite number'
+        if abs(n) >= bound:
+            # Clamp to the largest whole number, which floats represent exactly
+            return math.copysign(bound - 1, n), f'outside decimal({precision},{scale})'
+        return n, None
+    return check
+
+def integer_check(col_type):
+    low, high = INTEGER_RANGES[col_type]
+    def check(v):
+        n = to_number(v)
+        if n is None:
+            return None, 'not a finite number'
+        if n < low or n > high:
+            return min(max(n, low), high), f'outside {col_type}'
+        return n, None
+    return check
+
+def varchar_check(length):
+    def check(v):
+        v = str(v)
+        if len(v) > length:
+            return v[:length], f'longer than varchar({length})'
+        return v, None
+    return check
+
+def date_check(v):
+    if isinstance(v, str) and DATE_PATTERN.match(v):
+        return v, None
+    return None, 'not a YYYY-MM-DD date'
+
+class RowValidator:
+    """Column-wise validation of report rows against their table's DDL.
+
+    Out-of-range or malformed values are handled per `policy`:
+      'null'       - replace the value with NULL (default)
+      'clamp'      - clamp numbers to the column's range and truncate strings
+      'quarantine' - replace with NULL and record (table, cik, fiscal_year, column, value, reason)
+                     for the REJECTS_TABLE
+    Rows whose key columns are invalid are always dropped and recorded as rejects.
+    """
+
+    POLICIES = ('null', 'clamp', 'quarantine')
+
+    def __init__(self, column_types, columns, policy='null', table='sec_financial_reports',
+                 key_columns=('cik', 'fiscal_year')):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown validation policy: {policy}")
+        self.policy = policy
+        self.table = table
+        self.key_columns = key_columns
+        self.columns = list(columns)
+        self.cik_index = self.columns.index('cik')
+        self.year_index = self.columns.index('fiscal_year') if 'fiscal_year' in self.columns else None
+        self.checks = [] # [(index, column, check)]
+        for i, col in enumerate(self.columns):
+            if col not in column_types:
+                logging.warning(f"Column {col} is not in the {table} DDL; it will not be validated.")
+                continue
+            col_type, size, scale = column_types[col]
+            if col_type == 'decimal':
+                self.checks.append((i, col, decimal_check(size, scale)))
+            elif col_type in INTEGER_RANGES:
+                self.checks.append((i, col, integer_check(col_type)))
+            elif col_type == 'varchar':
+                self.checks.append((i, col, varchar_check(size)))
+            elif col_type == 'date':
+                self.checks.append((i, col, date_check))
+
+    def validate(self, rows):
+        """Validates a batch of row tuples.
+
+        Returns (rows, rejects): rows has the same length as the input with dropped rows
+        set to None; rejects is a list of (table, cik, fiscal_year, column, value, reason).
+        """
+        if not rows:
+            return rows, []
+        columns = [list(c) for c in zip(*rows)]
+        dropped = set()
+        rejects = []
+        for i, col, check in self.checks:
+            values = columns[i]
+            for r, v in enumerate(values):
+                if v is None:
+                    continue
+                fixed, reason = check(v)
+                if reason is None:
+                    values[r] = fixed
+                    continue
+                metrics.incr('values_invalid')
+                if col in self.key_columns:
+                    dropped.add(r)
+                    rejects.append((self.table, columns[self.cik_index][r], None, col, str(v)[:255], reason))
+                    continue
+                if self.policy == 'clamp':
+                    values[r] = fixed
+                else:
+                    values[r] = None
+                    if self.policy == 'quarantine':
+                        year = columns[self.year_index][r] if self.year_index is not None else None
+                        rejects.append((self.table, columns[self.cik_index][r], year, col, str(v)[:255], reason))
+        validated = [None if r in dropped else row for r, row in enumerate(zip(*columns))]
+        return validated, rejects
+
+class ReportWriter:
+    """Buffers report rows for one table across companies and writes them in large batches.
+
+    A batch is flushed once `batch_size` rows are buffered or `flush_interval` seconds
+    have passed since the last flush, and each flush is one commit. Rows are upserted
+    with INSERT ... ON DUPLICATE KEY UPDATE, or, with `use_load_data`, loaded from a
+    temp TSV via LOAD DATA LOCAL INFILE into a temporary staging table and upserted
+    from there with the same ON DUPLICATE KEY UPDATE (the connection must be opened
+    with local_infile=True). Either way only `columns` are written, so other columns
+    (created_at, or price when it is left out) keep their stored values.
+    If a RowValidator is given, every batch is validated before it is written, so
+    the per-row fallback is only a last resort.
+    With `replace_by_cik`, the batch's CIKs are deleted before inserting, for tables
+    such as FACTS_TABLE that are reloaded whole per company and have no natural key.
+    Rows of a CIK that is added again before the flush replace its buffered rows, and
+    the per-row fallback reloads each CIK (DELETE plus rows) in its own transaction.
+    The connection is health-checked before every flush and replaced from the pool
+    if it stopped answering, so read `conn` back rather than keeping a copy.
+    Rows added with a `key` are tracked: after each commit, `on_commit` (if set) is
+    called with the keys whose rows are now all in the database. Keys of rows that
+    failed to write are left out.
+    """
+
+    def __init__(self, conn, columns=None, batch_size=REPORT_BATCH_SIZE,
+                 flush_interval=REPORT_FLUSH_INTERVAL, use_load_data=False, validator=None,
+                 table='sec_financial_reports', key_columns=('cik', 'fiscal_year'), replace_by_cik=False):
+        self.conn = conn
+        self.table = table
+        self.replace_by_cik = replace_by_cik
+        self.validator = validator
+        self.columns = list(columns or METRIC_PLAN.columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.use_load_data = use_load_data
+        self.buffer = [] # [(ticker, row_tuple)]
+        self.pending_keys = {} # key -> CIK of its buffered rows
+        self.on_commit = None
+        self.cik_index = self.columns.index('cik')
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self.flushes = 0
+
+        self.column_list = ', '.join(f"`{c}`" for c in self.columns)
+        updates = ', '.join(f"`{c}` = VALUES(`{c}`)" for c in self.columns if c not in key_columns)
+        self.upsert_sql = (f"INSERT INTO {table} ({self.column_list}) "
+                           f"VALUES ({', '.join(['?'] * len(self.columns))}) "
+                           f"ON DUPLICATE KEY UPDATE {updates}")
+        self.staging_table = f"{table}_staging"
+        self.staging_upsert_sql = (f"INSERT INTO {table} ({self.column_list}) "
+                                   f"SELECT {self.column_list} FROM {self.staging_table} "
+                                   f"ON DUPLICATE KEY UPDATE {updates}")
+
+    def add_rows(self, ticker, rows, key=None):
+        """Buffers already cleaned row tuples in `columns` order, flushing if the batch is full or stale.
+
+        `key` identifies the rows in on_commit once they are committed.
+        """
+        if self.replace_by_cik and rows:
+            ciks = {row[self.cik_index] for row in rows}
+            if any(row[self.cik_index] in ciks for _, row in self.buffer):
+                self.buffer = [(t, row) for t, row in self.buffer if row[self.cik_index] not in ciks]
+        self.buffer.extend((ticker, row) for row in rows)
+        if key is not None and rows:
+            self.pending_keys[key] = rows[0][self.cik_index]
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes and commits all buffered rows."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        self.conn = healthy_connection(self.conn, local_infile=self.use_load_data)
+        if self.conn is None:
+            raise mariadb.Error(f"No database connection; {len(self.buffer)} {self.table} rows not written")
+        batch, self.buffer = self.buffer, []
+        keys, self.pending_keys = self.pending_keys, {}
+        rejects = []
+        if self.validator:
+            validated, rejects = self.validator.validate([row for _, row in batch])
+            batch = [(ticker, row) for (ticker, _), row in zip(batch, validated) if row is not None]
+        values = [row for _, row in batch]
+
+        start = time.monotonic()
+        cursor = self.conn.cursor()
+        try:
+            if self.replace_by_cik and batch:
+                ciks = sorted({row[self.cik_index] for _, row in batch})
+                cursor.execute(f"DELETE FROM {self.table} WHERE cik IN ({', '.join(['?'] * len(ciks))})", ciks)
+            if values and self.use_load_data:
+                self.load_data_infile(cursor, values)
+            elif values:
+                cursor.executemany(self.upsert_sql, values)
+            if rejects:
+                cursor.executemany(
+                    f"INSERT INTO {REJECTS_TABLE} (table_name, cik, fiscal_year, column_name, value, reason) VALUES (?, ?, ?, ?, ?, ?)",
+                    rejects)
+                metrics.incr('values_quarantined', len(rejects))
+            self.conn.commit()
+            written = len(values)
+            failed_ciks = set()
+        except mariadb.Error as e:
+            logging.error(f"Batch upsert of {len(values)} rows failed: {e}. Falling back to individual inserts for debugging.")
+            self.conn.rollback()
+            written, failed_ciks = self.write_individually(cursor, batch)
+        finally:
+            cursor.close()
+        if self.on_commit and keys:
+            self.on_commit([key for key, cik in keys.items() if cik not in failed_ciks])
+
+        elapsed = time.monotonic() - start
+        self.rows_written += written
+        self.write_seconds += elapsed
+        self.flushes += 1
+        metrics.record('insert', f"{self.table}:flush{self.flushes}", elapsed)
+        metrics.incr('rows_written', written)
+        logging.info(f"Flushed {written} rows to {self.table} in {elapsed:.2f}s ({written / elapsed if elapsed else 0:.0f} rows/s).")
+
+    def load_data_infile(self, cursor, values):
+        """
+        Loads rows via a temporary TSV file and LOAD DATA LOCAL INFILE into a staging
+        table, then upserts them into the table. The staging table is a per-connection
+        TEMPORARY copy of the table; within a batch the last row per key wins, as with
+        executemany.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', delete=False) as f:
+            for row in values:
+                f.write('\t'.join(tsv_field(v) for v in row) + '\n')
+            tsv_path = f.name
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {self.staging_table} LIKE {self.table}")
+            cursor.execute(f"DELETE FROM {self.staging_table}")
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE '{tsv_path}' REPLACE INTO TABLE {self.staging_table} "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({self.column_list})"
+            )
+            cursor.execute(self.staging_upsert_sql)
+        finally:
+            os.remove(tsv_path)
+
+    def write_individually(self, cursor, batch):
+        """Last-resort fallback: writes rows one at a time so one bad row cannot sink the batch.
+
+        Returns (rows written, CIKs with a row that failed).
+        """
+        if self.replace_by_cik:
+            return self.replace_individually(cursor, batch)
         success_count = 0
-        for i, row in enumerate(values):
+        failed_ciks = set()
+        for i, (ticker, row) in enumerate(batch):
             try:
-                cursor.execute(sql, row)
-                conn.commit()
+                cursor.execute(self.upsert_sql, row)
+                self.conn.commit()
                 success_count += 1
             except mariadb.Error as e2:
                 logging.error(f"Error at row {i} for {ticker}: {e2}")
+                failed_ciks.add(row[self.cik_index])
                 # Log detailed row info
-                row_dict = dict(zip(columns, row))
+                row_dict = dict(zip(self.columns, row))
                 logging.error(f"Row {i} Data: {row_dict}")
-                # Try to identify which column is the problem
-                for j, val in enumerate(row):
+        logging.info(f"Individual fallback completed. {success_count}/{len(batch)} records succeeded.")
+        return success_count, failed_ciks
+
+    def replace_individually(self, cursor, batch):
+        """Fallback for `replace_by_cik`: reloads one CIK per transaction.
+
+        The batch DELETE was rolled back with the failed batch, so each CIK is deleted
+        again before its rows are inserted one at a time; a failing row rolls the whole
+        CIK back, leaving its previously stored rows in place.
+        Returns (rows written, CIKs with a row that failed).
+        """
+        rows_by_cik = {}
+        for ticker, row in batch:
+            rows_by_cik.setdefault(row[self.cik_index], []).append((ticker, row))
+        success_count = 0
+        failed_ciks = set()
+        for cik, cik_rows in rows_by_cik.items():
+            try:
+                cursor.execute(f"DELETE FROM {self.table} WHERE cik = ?", (cik,))
+                for i, (ticker, row) in enumerate(cik_rows):
                     try:
-                        temp_sql = f"REPLACE INTO sec_financial_reports ({list(columns)[j]}) VALUES (?)"
-                        cursor.execute(temp_sql, (val, ))
-                    except mariadb.Error:
-                        logging.error(f"Problematic Column found: Index {j} ({list(columns)[j]}), Value: {val}, Type: {type(val)}")
-        logging.info(f"Individual fallback completed for {ticker}. {success_count}/{len(values)} records succeeded.")
+                        cursor.execute(self.upsert_sql, row)
+                    except mariadb.Error as e2:
+                        logging.error(f"Error at row {i} for {ticker}: {e2}")
+                        logging.error(f"Row {i} Data: {dict(zip(self.columns, row))}")
+                        raise
+                self.conn.commit()
+                success_count += len(cik_rows)
+            except mariadb.Error as e2:
+                logging.error(f"Reloading {self.table} rows of CIK {cik} failed: {e2}")
+                self.conn.rollback()
+                failed_ciks.add(cik)
+        logging.info(f"Individual fallback completed. {success_count}/{len(batch)} records succeeded.")
+        return success_count, failed_ciks
+
+    def close(self):
+        """Flushes remaining rows and logs overall write throughput."""
+        self.flush()
+        rate = self.rows_written / self.write_seconds if self.write_seconds else 0
+        logging.info(f"ReportWriter wrote {self.rows_written} rows to {self.table} in {self.write_seconds:.1f}s ({rate:.0f} rows/s).")
+
+class ArchiveWriter:
+    """Compresses raw SEC payloads into DATA_DIR archives on a background thread pool.
+
+    Archives are written with `codec` (an ArchiveCodec) to a staged '<archive>.pending'
+    file. commit() moves it into place once the company's rows are in the database,
+    and removes any archive of the same CIK in another codec. Archives that were never
+    committed are deleted by close(), so the company is imported again next run.
+    submit() blocks while `max_pending` payloads are waiting, which bounds the memory
+    held by the archiver.
+    """
+
+    def __init__(self, codec, workers=ARCHIVE_WORKERS, max_pending=ARCHIVE_MAX_PENDING):
+        self.codec = codec
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archive')
+        self.slots = threading.BoundedSemaphore(max(max_pending, workers))
+        self.staged = {} # archive path -> Future of its staged write
+
+    def path_for(self, cik_str):
+        return archive_path(DATA_DIR, cik_str, self.codec.name)
+
+    def write(self, raw_bytes, path, ticker):
+        try:
+            with metrics.timed('compress', ticker):
+                data = self.codec.compress(raw_bytes)
+                write_file_atomic(path + '.pending', data)
+            metrics.incr('archive_bytes_raw', len(raw_bytes))
+            metrics.incr('archive_bytes_written', len(data))
+            return True
+        except Exception as e:
+            logging.error(f"Failed to archive {path}: {e}")
+            return False
+        finally:
+            self.slots.release()
+
+    def submit(self, raw_bytes, path, ticker=None):
+        """Queues the original SEC bytes for compression into path's staged file."""
+        if path in self.staged:
+            # Same CIK under another ticker: let the earlier write finish first
+            self.staged[path].result()
+        self.slots.acquire()
+        self.staged[path] = self.executor.submit(self.write, raw_bytes, path, ticker)
+
+    def commit(self, path):
+        """Moves path's staged archive into place once its rows are committed."""
+        future = self.staged.pop(path, None)
+        if future is None or not future.result():
+            return
+        try:
+            os.replace(path + '.pending', path)
+            remove_other_archives(path)
+            metrics.incr('archives_written')
+        except OSError as e:
+            logging.error(f"Failed to archive {path}: {e}")
+
+    def close(self):
+        """Waits for queued archives, drops uncommitted ones and logs the compression ratio."""
+        self.executor.shutdown(wait=True)
+        for path in self.staged:
+            if os.path.exists(path + '.pending'):
+                os.remove(path + '.pending')
+        if self.staged:
+            logging.warning(f"Discarded {len(self.staged)} archives whose rows were not committed; they are imported again next run.")
+        self.staged = {}
+        counters = metrics.snapshot()
+        if counters.get('archives_written'):
+            ratio = counters['archive_bytes_raw'] / max(counters['archive_bytes_written'], 1)
+            logging.info(f"Archived {counters['archives_written']} payloads with {self.codec.describe()} "
+                         f"({ratio:.1f}x smaller).")
+
+def log_memory_usage(i):
+    """Garbage collects and logs memory usage (every 50 companies, or always when high)."""
+    # Garbage collect after every company to keep memory low
+    gc.collect()
+    if psutil:
+        mem = psutil.Process().memory_info().rss / (1024 * 1024)
+        if mem > 500: # Threshold for aggressive logging
+            logging.warning(f"High memory usage: {mem:.2f} MB")
+        elif i % 50 == 0:
+            logging.info(f"Current memory usage: {mem:.2f} MB")
+
+def fetch_company_facts(cik_str, ticker, validators=None):
+    """Downloads a company's facts from the SEC.
+
+    If `validators` ({'etag', 'last_modified'}) are given, a conditional GET is sent.
+    Returns (payload, validators): payload is the raw response bytes, or None if the
+    SEC answered 304 Not Modified.
+    """
+    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik_str}.json"
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    logging.info(f"Downloading data for {ticker} from SEC...")
+    start = time.monotonic()
+    response = request_with_retry(url, headers=headers, ticker=ticker)
+    if response.status_code == 304:
+        metrics.record('download', ticker, time.monotonic() - start)
+        metrics.incr('not_modified')
+        return None, validators
+    metrics.record('download', ticker, time.monotonic() - start, nbytes=len(response.content))
+    metrics.incr('companies_downloaded')
+    metrics.incr('bytes_downloaded', len(response.content))
+    return response.content, {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+def download_worker(jobs, results):
+    """Thread target: downloads queued companies and hands them to the loader.
+
+    `results` is bounded, so workers block once the loader falls behind.
+    A `None` is put on `results` when the worker runs out of jobs.
+    """
+    while True:
+        job = jobs.get()
+        if job is None:
+            results.put(None)
+            return
+        cik_str, ticker, archive_file, validators = job
+        try:
+            payload, validators = fetch_company_facts(cik_str, ticker, validators)
+            results.put((cik_str, ticker, archive_file, payload, validators, None))
+        except Exception as e:
+            results.put((cik_str, ticker, archive_file, None, None, e))
+
+def iter_downloads_concurrently(pending, workers):
+    """Downloads `pending` companies with `workers` threads, yielding them as they finish.
+
+    All threads share the process-wide `sec_throttle`, so total request rate stays
+    below SEC_MAX_REQUESTS_PER_SECOND regardless of worker count, and a 403/429 seen
+    by one thread pauses them all.
+    """
+    jobs = queue.Queue()
+    for job in pending:
+        jobs.put(job)
+    for _ in range(workers):
+        jobs.put(None)
+
+    results = queue.Queue(maxsize=workers * 2)
+    threads = [threading.Thread(target=download_worker, args=(jobs, results), daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    finished = 0
+    while finished < workers:
+        item = results.get()
+        if item is None:
+            finished += 1
+            continue
+        yield item
+
+def iter_downloads_serially(pending):
+    """Downloads `pending` companies one at a time, yielding them as they finish."""
+    for cik_str, ticker, archive_file, validators in pending:
+        try:
+            payload, validators = fetch_company_facts(cik_str, ticker, validators)
+        except Exception as e:
+            yield cik_str, ticker, archive_file, None, None, e
+            continue
+        yield cik_str, ticker, archive_file, payload, validators, None
+
+# SEC nightly bulk archive members are named CIK##########.json
+BULK_MEMBER_PATTERN = re.compile(r'^CIK(\d{10})\.json$')
+
+def list_bulk_zip_members(zip_path, companies_to_process):
+    """Returns [(cik_str, ticker, member_name)] for archive members whose CIK is in companies_to_process."""
+    tickers_by_cik = {str(c['cik_str']).zfill(10): c['ticker'] for c in companies_to_process.values()}
+    members = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in zf.namelist():
+            match = BULK_MEMBER_PATTERN.match(os.path.basename(name))
+            if match and match.group(1) in tickers_by_cik:
+                members.append((match.group(1), tickers_by_cik[match.group(1)], name))
+    return members
+
+def iter_bulk_zip_payloads(zip_path, members):
+    """Reads members of the SEC nightly companyfacts.zip, yielding them like iter_downloads_*.
+
+    No HTTP requests are made and archive_file is None, so nothing is written to DATA_DIR.
+    """
+    with zipfile.ZipFile(zip_path) as zf:
+        for cik_str, ticker, name in members:
+            try:
+                # Reading a member stands in for the download stage in metrics
+                start = time.monotonic()
+                with zf.open(name) as member:
+                    payload = member.read()
+                metrics.record('download', ticker, time.monotonic() - start, nbytes=len(payload))
+                metrics.incr('bytes_read', len(payload))
+            except Exception as e:
+                yield cik_str, ticker, None, None, None, e
+                continue
+            yield cik_str, ticker, None, payload, None, None
+
+class ReprocessProgress:
+    """Archives a --reprocess-archive run has finished, checkpointed to REPROCESS_STATE_FILE.
+
+    An interrupted run resumes where it stopped; the checkpoint is removed once
+    every archive has been reprocessed.
+    """
+
+    def __init__(self, ciks, path=REPROCESS_STATE_FILE):
+        self.path = path
+        self.ciks = set(ciks)
+        self.done = set()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.done = set(json.load(f))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable reprocess state {path}: {e}")
+        self.started = time.monotonic()
+        self.processed = 0
+
+    def mark(self, cik):
+        self.done.add(cik)
+        self.processed += 1
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+    def save(self):
+        write_json_atomic(self.path, sorted(self.done))
+        logging.info(f"Reprocessed {self.processed} archives this run ({self.rate():.1f} files/s).")
+
+    def finish(self):
+        """Saves the checkpoint, or removes it once every archive of the run is done."""
+        if self.ciks <= self.done:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            logging.info(f"Reprocessed {self.processed} archives this run ({self.rate():.1f} files/s).")
+        else:
+            self.save()
+
+def list_archive_files(data_dir, companies_to_process):
+    """Returns [(cik_str, ticker, path)] for the CIK##########.json.gz/.json.zst archives in data_dir.
+
+    Archives are limited to companies_to_process; if that is empty every archive is
+    listed and the CIK stands in for the ticker.
+    """
+    tickers_by_cik = {str(c['cik_str']).zfill(10): c['ticker'] for c in companies_to_process.values()}
+    files = []
+    for cik_str, path in sorted(list_archives(data_dir).items()):
+        if tickers_by_cik and cik_str not in tickers_by_cik:
+            continue
+        files.append((cik_str, tickers_by_cik.get(cik_str, cik_str), path))
+    return files
+
+def iter_archive_payloads(files):
+    """Reads archived payloads, yielding them like iter_downloads_*.
+
+    Payloads stay compressed; the parse workers decompress them (parse_company_facts).
+    No HTTP requests are made and archive_file is None, so archives are not rewritten.
+    """
+    for cik_str, ticker, path in files:
+        try:
+            start = time.monotonic()
+            with open(path, 'rb') as f:
+                payload = f.read()
+            metrics.record('download', ticker, time.monotonic() - start, nbytes=len(payload))
+            metrics.incr('bytes_read', len(payload))
+        except OSError as e:
+            yield cik_str, ticker, None, None, None, e
+            continue
+        yield cik_str, ticker, None, payload, None, None
+
+def run_inline(fn, *args):
+    """Runs fn immediately and returns a completed Future (used with --parse-processes 0)."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def db_writer_loop(writers, rows_queue, failed, committed):
+    """Writer stage of the import pipeline: the only thread that touches the DB connection.
+
+    `writers` is {table: ReportWriter}. Consumes (key, ticker, {table: rows}) items until
+    a None sentinel, then closes the writers; rows for tables without a writer are
+    dropped. A company's key is put on `committed` once its rows in every table are
+    committed; companies whose rows fail to write are never reported.
+    Each flush health-checks its connection (healthy_connection). If no
+    connection can be obtained, `failed` is set and remaining items are drained
+    without writing so producers never block.
+    """
+    waiting = {} # key -> tables still holding uncommitted rows of that company
+
+    def on_commit(table, keys):
+        for key in keys:
+            tables = waiting.get(key)
+            if tables is None:
+                continue
+            tables.discard(table)
+            if not tables:
+                del waiting[key]
+                committed.put(key)
+
+    for table, writer in writers.items():
+        writer.on_commit = functools.partial(on_commit, table)
+
+    while True:
+        item = rows_queue.get()
+        if item is None:
+            break
+        if failed.is_set():
+            continue
+        key, ticker, rows_by_table = item
+        tables = {table for table, rows in rows_by_table.items() if table in writers and rows}
+        if not tables:
+            committed.put(key)
+            continue
+        waiting[key] = set(tables)
+        for table in tables:
+            try:
+                writers[table].add_rows(ticker, rows_by_table[table], key=key)
+            except Exception as e:
+                logging.error(f"Failed to write {table} rows for {ticker}: {e}")
+        if any(writer.conn is None for writer in writers.values()):
+            logging.error("Failed to reconnect to database. Stopping import.")
+            failed.set()
+
+    if not failed.is_set():
+        for writer in writers.values():
+            writer.close()
+
+def run_import_pipeline(sources, total, writers, price_cache, refresh_state, parse_processes, refresh=False,
+                        progress=None, archiver=None):
+    """Runs the import as a three-stage pipeline.
+
+    1. `sources` yields (cik_str, ticker, archive_file, payload, validators, error) from
+       download threads (iter_downloads_*) or the bulk archive (iter_bulk_zip_payloads).
+    2. A ProcessPoolExecutor with `parse_processes` workers turns payloads into row
+       tuples (parse_company_payload); 0 parses on this thread instead.
+    3. A single writer thread (db_writer_loop) owns the DB connection and feeds
+       `writers` ({table: ReportWriter}). Only tables with a writer are built.
+
+    At most 2 payloads per parse process are in flight and PIPELINE_QUEUE_SIZE
+    companies may wait for the writer, so a slow stage throttles the ones before it.
+    Raw payloads are handed to `archiver` (an ArchiveWriter) when the source names an
+    archive_file. The archive, `refresh_state` and `progress` (a ReprocessProgress, if
+    given) are only updated once the writer reports the company's rows committed, so a
+    failed flush or an interrupted run never leaves a company looking imported.
+    Returns the number of companies skipped as unchanged.
+    """
+    rows_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    committed = queue.Queue()
+    columns_by_table = {table: writer.columns for table, writer in writers.items()}
+    wants_price = 'price' in columns_by_table.get('sec_financial_reports', ())
+    failed = threading.Event()
+    writer_thread = threading.Thread(target=db_writer_loop, args=(writers, rows_queue, failed, committed), name='db-writer')
+    writer_thread.start()
+    parse_pool = ProcessPoolExecutor(max_workers=parse_processes) if parse_processes > 0 else None
+    max_in_flight = parse_processes * 2 if parse_pool else 1
+    in_flight = collections.deque()
+    skipped_unchanged = 0
+    uncommitted = {} # key -> (cik_str, archive_file, filed, accn, validators) of companies queued for the writer
+    next_key = itertools.count()
+
+    def record_committed():
+        """Archives and records the companies whose rows the writer has committed."""
+        while True:
+            try:
+                key = committed.get_nowait()
+            except queue.Empty:
+                return
+            cik_str, archive_file, filed, accn, validators = uncommitted.pop(key)
+            if archive_file and archiver:
+                archiver.commit(archive_file)
+            refresh_state.update(cik_str, accn=accn, filed=filed, **(validators or {}))
+            if progress:
+                progress.mark(cik_str)
+
+    def finish_oldest():
+        cik_str, ticker, archive_file, payload, validators, future = in_flight.popleft()
+        try:
+            rows_by_table, filed, accn, missing, timings = future.result()
+        except Exception as e:
+            metrics.incr('errors')
+            logging.error(f"Unexpected error processing {ticker}: {e}")
+            return
+        for stage, seconds in timings.items():
+            metrics.record(stage, ticker, seconds)
+        metrics.incr('companies_parsed')
+
+        for field, year in missing:
+            logging.warning(f"Could not find any matching tag for '{field}' for {ticker} in FY{year}.")
+        # The archive is staged now and committed with the rows (record_committed),
+        # so a company whose rows never reach the database is retried next run
+        if archive_file and archiver:
+            archiver.submit(payload, archive_file, ticker)
+        key = next(next_key)
+        uncommitted[key] = (cik_str, archive_file, filed, accn, validators)
+        rows_queue.put((key, ticker, rows_by_table))
+        if any(rows_by_table.values()):
+            annual = len(rows_by_table.get('sec_financial_reports', ()))
+            quarterly = len(rows_by_table.get(QUARTERLY_TABLE, ()))
+            metrics.incr('rows_queued', sum(len(rows) for rows in rows_by_table.values()))
+            logging.info(f"Queued {annual} annual and {quarterly} quarterly reports for {ticker}.")
+
+    try:
+        for i, (cik_str, ticker, archive_file, payload, validators, error) in enumerate(sources):
+            log_memory_usage(i)
+            record_committed()
+            if failed.is_set():
+                break
+            if i > 0 and i % 100 == 0:
+                refresh_state.save()
+                if progress:
+                    progress.save()
+                logging.info(f"Progress: {metrics.snapshot()}")
+
+            if error is not None:
+                metrics.incr('errors')
+                logging.error(f"Unexpected error processing {ticker}: {error}")
+                continue
+
+            if payload is None:
+                skipped_unchanged += 1
+                logging.info(f"({i+1}/{total}) {ticker} not modified since last import (304)")
+                continue
+
+            if refresh:
+                # Facts re-published without a new filing are skipped before the parse stage
+                _, accn = latest_filing_in_bytes(decompress_payload(payload))
+                if accn and accn == refresh_state.get(cik_str).get('accn'):
+                    skipped_unchanged += 1
+                    refresh_state.update(cik_str, **(validators or {}))
+                    logging.info(f"({i+1}/{total}) {ticker} has no new filings since {accn}. Skipping reload.")
+                    continue
+
+            logging.info(f"({i+1}/{total}) Processing {ticker} (CIK: {cik_str})")
+            price = price_cache.get(ticker) if wants_price else None
+            if wants_price and price is None:
+                logging.warning(f"No cached price for {ticker}.")
+            if parse_pool:
+                future = parse_pool.submit(parse_company_payload, cik_str, ticker, payload, price, columns_by_table)
+            else:
+                future = run_inline(parse_company_payload, cik_str, ticker, payload, price, columns_by_table)
+            in_flight.append((cik_str, ticker, archive_file, payload, validators, future))
+            del payload
+
+            while len(in_flight) >= max_in_flight:
+                finish_oldest()
+
+        while in_flight:
+            finish_oldest()
+    finally:
+        rows_queue.put(None)
+        writer_thread.join()
+        record_committed()
+        if uncommitted:
+            logging.error(f"{len(uncommitted)} companies were not committed to the database; they are imported again next run.")
+        if parse_pool:
+            parse_pool.shutdown(cancel_futures=True)
+
+    return skipped_unchanged
+
+def iter_stored_companies(conn):
+    """Streams FACTS_TABLE back as (cik, company_data) with only what the annual and quarterly builders read.
+
+    Rows are read in insertion order with an unbuffered cursor, so `conn` cannot be
+    used for anything else until the iterator is exhausted.
+    """
+    quarterly_tags = sorted({tag for col, tags in METRIC_PLAN.direct if col in QUARTERLY_METRICS for tag in tags})
+    unit_marks = ', '.join(['?'] * len(ANNUAL_UNITS))
+    tag_marks = ', '.join(['?'] * len(quarterly_tags))
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(
+            f"SELECT cik, tag, unit, {', '.join(f'`{c}`' for c in FACT_ITEM_FIELDS)} FROM {FACTS_TABLE} "
+            f"WHERE taxonomy = 'us-gaap' AND unit IN ({unit_marks}) AND (fp = 'FY' OR tag IN ({tag_marks})) "
+            f"ORDER BY cik, id",
+            (*ANNUAL_UNITS, *quarterly_tags))
+        cik, gaap = None, {}
+        for row in cursor:
+            if row[0] != cik:
+                if cik is not None:
+                    yield cik, {'facts': {'us-gaap': gaap}}
+                cik, gaap = row[0], {}
+            gaap.setdefault(row[1], {'units': {}})['units'].setdefault(row[2], []).append(fact_item(row[3:]))
+        if cik is not None:
+            yield cik, {'facts': {'us-gaap': gaap}}
     finally:
         cursor.close()
 
-def gzip_file(file_path):
-    """Compresses a file using gzip and removes the original."""
-    if not os.path.exists(file_path):
-        return
-    
-    gz_path = file_path + '.gz'
-    with open(file_path, 'rb') as f_in:
-        with gzip.open(gz_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-    
-    os.remove(file_path)
+def rederive_reports(read_conn, writers):
+    """Rebuilds report rows for every company in FACTS_TABLE with the current METRIC_PLAN.
+
+    No SEC requests are made. Rows go through `writers` ({table: ReportWriter}) in
+    each writer's column order; columns the facts do not hold (price) should be left
+    out of the annual writer so the stored values are kept.
+    """
+    columns_by_table = {table: writer.columns for table, writer in writers.items()}
+    companies = 0
+    for cik, company_data in iter_stored_companies(read_conn):
+        with metrics.timed('derive', cik):
+            rows_by_table, _ = build_table_rows(company_data, cik, None, columns_by_table)
+        for table, rows in rows_by_table.items():
+            writers[table].add_rows(cik, rows)
+        companies += 1
+        metrics.incr('companies_parsed')
+        if companies % 100 == 0:
+            logging.info(f"Rederived {companies} companies: {metrics.snapshot()}")
+    for writer in writers.values():
+        writer.close()
+    logging.info(f"Rederived reports for {companies} companies from {FACTS_TABLE}.")
 
 def main():
     """Main function to orchestrate the entire ETL process."""
     parser = argparse.ArgumentParser(description='Import SEC data for one or all tickers.')
     parser.add_argument('--ticker', type=str, help='Specify a single ticker to process.')
     parser.add_argument('--limit', type=int, help='Limit the number of companies to process.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of concurrent SEC download threads (default: 1).')
+    parser.add_argument('--parse-processes', type=int, default=os.cpu_count() or 1, help='Number of processes parsing facts into rows; 0 parses on the main thread (default: CPU count).')
+    parser.add_argument('--from-bulk-zip', type=str, metavar='PATH', help='Import from a local SEC companyfacts.zip instead of downloading each company.')
+    parser.add_argument('--batch-size', type=int, default=REPORT_BATCH_SIZE, help=f'Rows per sec_financial_reports upsert batch (default: {REPORT_BATCH_SIZE}).')
+    parser.add_argument('--flush-interval', type=float, default=REPORT_FLUSH_INTERVAL, help=f'Seconds before a partial batch is flushed (default: {REPORT_FLUSH_INTERVAL}).')
+    parser.add_argument('--load-data-infile', action='store_true', help='Write batches with LOAD DATA LOCAL INFILE from a temp TSV instead of INSERT ... ON DUPLICATE KEY UPDATE.')
+    parser.add_argument('--metrics-file', type=str, default=METRICS_SUMMARY_FILE, help=f'Where to write the JSON run summary (default: {METRICS_SUMMARY_FILE}).')
+    parser.add_argument('--invalid-values', choices=RowValidator.POLICIES, default='null', help=f'How to handle values that do not fit their sec_financial_reports column: set NULL, clamp, or NULL plus a copy in {REJECTS_TABLE} (default: null).')
+    parser.add_argument('--skip-quarterly', action='store_true', help=f'Do not write de-cumulated 10-Q rows to {QUARTERLY_TABLE}.')
+    parser.add_argument('--store-facts', action='store_true', help=f'Also bulk-load every fact into {FACTS_TABLE} so reports can be rebuilt with --rederive.')
+    parser.add_argument('--rederive', action='store_true', help=f'Rebuild sec_financial_reports and {QUARTERLY_TABLE} from {FACTS_TABLE} with the current METRIC_MAP, without contacting the SEC.')
+    parser.add_argument('--reprocess-archive', action='store_true', help=f'Re-parse the CIK##########.json.gz/.json.zst archives in {DATA_DIR} without any HTTP requests; resumes an interrupted run.')
+    parser.add_argument('--archive-codec', choices=('gzip', 'zstd'), default='gzip', help='Codec for new raw payload archives; zstd needs the zstandard package (default: gzip).')
+    parser.add_argument('--archive-level', type=int, help='Archive compression level (default: gzip 6, zstd 9).')
+    parser.add_argument('--archive-dict', type=str, metavar='PATH', help=f'zstd dictionary for new archives (default: the latest one trained with sec_archive.py in {DATA_DIR}).')
+    parser.add_argument('--archive-workers', type=int, default=ARCHIVE_WORKERS, help=f'Background threads compressing archives (default: {ARCHIVE_WORKERS}).')
+    parser.add_argument('--refresh', action='store_true', help='Re-check already imported companies with conditional requests and reload only those with new filings.')
     args = parser.parse_args()
 
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
+    archive_dict = args.archive_dict
+    if args.archive_codec == 'zstd' and archive_dict is None:
+        archive_dict = latest_dictionary(DATA_DIR)
+    archiver = ArchiveWriter(ArchiveCodec(args.archive_codec, args.archive_level, archive_dict, DATA_DIR),
+                             workers=max(args.archive_workers, 1))
+    # One kept-alive connection per download thread and SEC host
+    sec_session.mount('https://', make_sec_adapter(max(args.workers, SEC_POOL_CONNECTIONS_PER_HOST)))
 
-    conn = get_db_connection()
+    conn = get_db_connection(local_infile=args.load_data_infile)
     if not conn:
         return
 
+    refresh_state = RefreshState()
+    # Offline rebuilds fetch no prices, so they keep the stored one
+    keep_price = args.rederive or args.reprocess_archive
+    report_columns = [c for c in METRIC_PLAN.columns if not (keep_price and c == 'price')]
+    validator = RowValidator(parse_table_columns(load_table_ddl(conn)), report_columns, policy=args.invalid_values)
+    writer = ReportWriter(conn, report_columns, batch_size=args.batch_size, flush_interval=args.flush_interval,
+                          use_load_data=args.load_data_infile, validator=validator)
+    writers = {'sec_financial_reports': writer}
+    if not args.skip_quarterly:
+        key_columns = ('cik', 'fiscal_year', 'fiscal_quarter')
+        quarterly_validator = RowValidator(parse_table_columns(load_table_ddl(conn, QUARTERLY_TABLE)), QUARTERLY_COLUMNS,
+                                           policy=args.invalid_values, table=QUARTERLY_TABLE, key_columns=key_columns)
+        writers[QUARTERLY_TABLE] = ReportWriter(conn, QUARTERLY_COLUMNS, batch_size=args.batch_size,
+                                                flush_interval=args.flush_interval, use_load_data=args.load_data_infile,
+                                                validator=quarterly_validator, table=QUARTERLY_TABLE,
+                                                key_columns=key_columns)
+    if args.store_facts and not args.rederive:
+        facts_validator = RowValidator(parse_table_columns(load_table_ddl(conn, FACTS_TABLE)), FACT_COLUMNS,
+                                       policy=args.invalid_values, table=FACTS_TABLE, key_columns=('cik',))
+        writers[FACTS_TABLE] = ReportWriter(conn, FACT_COLUMNS, batch_size=args.batch_size,
+                                            flush_interval=args.flush_interval, use_load_data=args.load_data_infile,
+                                            validator=facts_validator, table=FACTS_TABLE, key_columns=(),
+                                            replace_by_cik=True)
+    progress = None
     try:
-        tickers_file = download_company_tickers()
+        if args.rederive:
+            read_conn = get_db_connection()
+            if not read_conn:
+                return
+            try:
+                rederive_reports(read_conn, writers)
+            finally:
+                read_conn.close()
+            return
+
+        if (args.from_bulk_zip or args.reprocess_archive) and os.path.exists(TICKERS_FILE):
+            # Offline modes reuse a tickers list that is already on disk
+            tickers_file = TICKERS_FILE
+        elif args.reprocess_archive:
+            tickers_file = None # Archives are listed by CIK alone
+        else:
+            tickers_file = download_company_tickers()
         if tickers_file:
             populate_companies_table(conn, tickers_file)
-        else:
+        elif not args.reprocess_archive:
             logging.error("Could not download company list. Exiting.")
             return
-            
-        with open(tickers_file, 'r', encoding='utf-8', errors='replace') as f:
-            companies = json.load(f)
+
+        companies = {}
+        if tickers_file:
+            with open(tickers_file, 'r', encoding='utf-8', errors='replace') as f:
+                companies = json.load(f)
 
         if args.ticker:
             companies_to_process = {k: v for k, v in companies.items() if v['ticker'] == args.ticker.upper()}
@@ -394,65 +2165,70 @@ def main():
         if args.limit:
             companies_to_process = dict(list(companies_to_process.items())[:args.limit])
 
-        logging.info(f"Starting to process {len(companies_to_process)} companies...")
-        
-        for i, company in enumerate(companies_to_process.values()):
-            # Garbage collect after every company to keep memory low
-            gc.collect()
-            if psutil:
-                mem = psutil.Process().memory_info().rss / (1024 * 1024)
-                if mem > 500: # Threshold for aggressive logging
-                    logging.warning(f"High memory usage: {mem:.2f} MB")
-                elif i % 50 == 0:
-                    logging.info(f"Current memory usage: {mem:.2f} MB")
-
-            # Periodic database connection refresh
-            if i > 0 and i % 100 == 0:
-                logging.info("Refreshing database connection...")
-                conn.close()
-                conn = get_db_connection()
-                if not conn:
-                    logging.error("Failed to reconnect to database. Exiting.")
-                    return
+        if args.reprocess_archive:
+            files = list_archive_files(DATA_DIR, companies_to_process)
+            if args.limit:
+                files = files[:args.limit]
+            progress = ReprocessProgress([cik_str for cik_str, _, _ in files])
+            files = [f for f in files if f[0] not in progress.done]
+            logging.info(f"Reprocessing {len(files)} archives from {DATA_DIR} "
+                         f"({len(progress.done)} already done) with {args.parse_processes} parse process(es)...")
+            price_cache = PriceCache()
+            sources = iter_archive_payloads(files)
+            total = len(files)
+        elif args.from_bulk_zip:
+            members = list_bulk_zip_members(args.from_bulk_zip, companies_to_process)
+            price_cache = fetch_prices_batched([ticker for _, ticker, _ in members], PriceCache())
+            logging.info(f"Starting to import {len(members)} companies from {args.from_bulk_zip}...")
+            sources = iter_bulk_zip_payloads(args.from_bulk_zip, members)
+            total = len(members)
+        else:
+            # Skip logic: If an archive exists (in any codec), we've already processed this company
+            pending = []
+            seen_ciks = set()
+            for i, company in enumerate(companies_to_process.values()):
+                cik_str = str(company['cik_str']).zfill(10)
+                ticker = company['ticker']
+                # Share classes list one CIK under several tickers; fetch it once, as the first
+                if cik_str in seen_ciks:
+                    continue
+                seen_ciks.add(cik_str)
+                archive_file = archiver.path_for(cik_str)
+                if args.refresh:
+                    pending.append((cik_str, ticker, archive_file, refresh_state.get(cik_str)))
+                    continue
+                if find_archive(DATA_DIR, cik_str):
+                    if i % 100 == 0 or args.ticker:
+                        logging.info(f"({i+1}/{len(companies_to_process)}) Skipping {ticker} (already processed)")
+                    continue
+                pending.append((cik_str, ticker, archive_file, None))
 
-            cik_str = str(company['cik_str']).zfill(10)
-            ticker = company['ticker']
-            
-            # Skip logic: If the compressed file exists, we've already processed this company
-            file_path = os.path.join(DATA_DIR, f"CIK{cik_str}.json")
-            if os.path.exists(file_path + '.gz'):
-                if i % 100 == 0 or args.ticker:
-                    logging.info(f"({i+1}/{len(companies_to_process)}) Skipping {ticker} (already processed)")
-                continue
+            price_cache = fetch_prices_batched([ticker for _, ticker, _, _ in pending], PriceCache())
 
-            logging.info(f"({i+1}/{len(companies_to_process)}) Processing {ticker} (CIK: {cik_str})")
-            url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik_str}.json"
-            
-            try:
-                logging.info(f"Downloading data for {ticker} from SEC...")
-                response = request_with_retry(url, headers=HEADERS)
-                logging.info(f"Saving {ticker} data to {file_path}...")
-                with open(file_path, 'w', encoding='utf-8', errors='replace') as f:
-                    json.dump(response.json(), f)
-                
-                # Explicitly delete large response objects
-                del response
-                
-                logging.info(f"Processing and loading financials for {ticker}...")
-                process_and_load_financials(conn, cik_str, ticker, file_path)
-                
-                gzip_file(file_path)
+            logging.info(f"Starting to process {len(pending)} companies with {args.workers} download worker(s)...")
+            if args.workers > 1:
+                sources = iter_downloads_concurrently(pending, args.workers)
+            else:
+                sources = iter_downloads_serially(pending)
+            total = len(pending)
 
-            except Exception as e:
-                logging.error(f"Unexpected error processing {ticker}: {e}")
-            
-            # Small sleep to be kind to SEC servers
-            time.sleep(0.1)
+        skipped_unchanged = run_import_pipeline(sources, total, writers, price_cache, refresh_state,
+                                                args.parse_processes, refresh=args.refresh, progress=progress,
+                                                archiver=archiver)
+        if args.refresh:
+            logging.info(f"Refresh complete: {skipped_unchanged}/{total} companies unchanged.")
 
     finally:
-        if conn:
-            conn.close()
-            logging.info("Database connection closed.")
+        archiver.close()
+        refresh_state.save()
+        if progress:
+            progress.finish()
+        metrics.write_summary(args.metrics_file)
+        # Writers may have swapped in fresh pooled connections
+        for open_conn in {id(w.conn): w.conn for w in writers.values() if w.conn}.values():
+            open_conn.close()
+        close_db_pools()
+        logging.info("Database connection closed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
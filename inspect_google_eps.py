@@ -1,9 +1,7 @@
-import json
-import gzip
+from sec_archive import DATA_DIR, find_archive, load_archive
 
 def find_metrics_for_years(target_years):
-    with gzip.open('sec_data/CIK0001652044.json.gz', 'rb') as f:
-        data = json.load(f)
+    data = load_archive(find_archive(DATA_DIR, '0001652044'))
     metrics_found = {year: [] for year in target_years}
     for metric, content in data['facts'].get('us-gaap', {}).items():
         for unit, items in content.get('units', {}).items():
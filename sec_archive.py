@@ -0,0 +1,245 @@
+"""Reading and writing of the raw SEC companyfacts archives in sec_data/.
+
+Archives are CIK##########.json.gz (gzip) or CIK##########.json.zst (zstd, optionally
+with a dictionary trained on companyfacts payloads). Readers should go through
+read_archive/load_archive: the codec is detected from the magic bytes and a zstd
+dictionary is looked up by the id stored in the frame, so archives written with
+different codecs or dictionaries can sit side by side.
+
+Usage:
+    python sec_archive.py train --samples 500
+    python sec_archive.py recompress --codec zstd --level 9
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DATA_DIR = 'sec_data'
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ARCHIVE_EXTENSIONS = {'gzip': '.json.gz', 'zstd': '.json.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 9}
+ARCHIVE_FILE_PATTERN = re.compile(r'^CIK(\d{10})\.json\.(?:gz|zst)$')
+
+# Trained dictionaries are kept as companyfacts-<dict id>.zdict; archives name the id they need
+ZSTD_DICT_FILE_PATTERN = re.compile(r'^companyfacts-(\d+)\.zdict$')
+ZSTD_DICT_SIZE = 112640 # zstd's default dictionary size (110 KB)
+ZSTD_TRAIN_SAMPLES = 500
+ZSTD_TRAIN_SAMPLE_BYTES = 256 * 1024 # Leading bytes of each payload used for training
+
+def require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("The zstd archive codec needs the 'zstandard' package (pip install zstandard).")
+
+def archive_path(data_dir, cik_str, codec_name='gzip'):
+    """Path of the CIK's archive when written with codec_name."""
+    return os.path.join(data_dir, f"CIK{cik_str}{ARCHIVE_EXTENSIONS[codec_name]}")
+
+def find_archive(data_dir, cik_str):
+    """Path of the CIK's existing archive in any codec, or None."""
+    for codec_name in ARCHIVE_EXTENSIONS:
+        path = archive_path(data_dir, cik_str, codec_name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def list_archives(data_dir):
+    """Returns {cik_str: path} for every archive in data_dir."""
+    archives = {}
+    for name in sorted(os.listdir(data_dir)):
+        match = ARCHIVE_FILE_PATTERN.match(name)
+        if match:
+            archives[match.group(1)] = os.path.join(data_dir, name)
+    return archives
+
+def dictionary_path(data_dir, dict_id):
+    return os.path.join(data_dir, f"companyfacts-{dict_id}.zdict")
+
+def latest_dictionary(data_dir):
+    """Path of the most recently trained dictionary in data_dir, or None."""
+    paths = [os.path.join(data_dir, name) for name in os.listdir(data_dir) if ZSTD_DICT_FILE_PATTERN.match(name)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def write_file_atomic(path, data):
+    """Writes data to path via a temp file and rename, so a partial file is never visible."""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def remove_other_archives(path):
+    """Deletes archives of the same CIK in other codecs, so each CIK has one archive."""
+    stem = path
+    for extension in ARCHIVE_EXTENSIONS.values():
+        if path.endswith(extension):
+            stem = path[:-len(extension)]
+    for extension in ARCHIVE_EXTENSIONS.values():
+        other = stem + extension
+        if other != path and os.path.exists(other):
+            os.remove(other)
+
+class ArchiveCodec:
+    """Compresses payloads with gzip or zstd at a fixed level.
+
+    zstd may use a trained dictionary (dict_path). Readers find a dictionary by the
+    id in the frame (dictionary_path), so one given from elsewhere is copied into
+    data_dir first, and a dictionary without an id is rejected. compress() may be
+    called from several threads; each thread gets its own zstd compressor.
+    """
+
+    def __init__(self, name='gzip', level=None, dict_path=None, data_dir=DATA_DIR):
+        if name not in ARCHIVE_EXTENSIONS:
+            raise ValueError(f"Unknown archive codec '{name}'.")
+        self.name = name
+        self.level = DEFAULT_LEVELS[name] if level is None else level
+        self.extension = ARCHIVE_EXTENSIONS[name]
+        self.dictionary = None
+        self.dict_path = None
+        if name == 'zstd':
+            require_zstandard()
+            if dict_path:
+                with open(dict_path, 'rb') as f:
+                    dict_bytes = f.read()
+                self.dictionary = zstandard.ZstdCompressionDict(dict_bytes)
+                self.dict_path = self.install_dictionary(dict_path, dict_bytes, data_dir)
+        self.local = threading.local()
+
+    def install_dictionary(self, dict_path, dict_bytes, data_dir):
+        """Returns the dictionary's path in data_dir, copying it there if it is missing."""
+        dict_id = self.dictionary.dict_id()
+        if not dict_id:
+            raise ValueError(f"zstd dictionary {dict_path} has no dictionary id; "
+                             f"train one with 'python sec_archive.py train' instead.")
+        installed = dictionary_path(data_dir, dict_id)
+        if not os.path.exists(installed):
+            write_file_atomic(installed, dict_bytes)
+        return installed
+
+    def describe(self):
+        desc = f"{self.name} level {self.level}"
+        if self.dict_path:
+            desc += f" with dictionary {os.path.basename(self.dict_path)}"
+        return desc
+
+    def compress(self, raw_bytes):
+        if self.name == 'gzip':
+            return gzip.compress(raw_bytes, compresslevel=self.level, mtime=0)
+        compressor = getattr(self.local, 'compressor', None)
+        if compressor is None:
+            compressor = self.local.compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self.dictionary, write_checksum=True)
+        return compressor.compress(raw_bytes)
+
+# Per-thread zstd decompressors, keyed by (data_dir, dictionary id)
+decompressors = threading.local()
+
+def zstd_decompressor(data, data_dir):
+    require_zstandard()
+    dict_id = zstandard.get_frame_parameters(data).dict_id
+    cache = getattr(decompressors, 'cache', None)
+    if cache is None:
+        cache = decompressors.cache = {}
+    key = (data_dir, dict_id)
+    if key not in cache:
+        dict_data = None
+        if dict_id:
+            with open(dictionary_path(data_dir, dict_id), 'rb') as f:
+                dict_data = zstandard.ZstdCompressionDict(f.read())
+        cache[key] = zstandard.ZstdDecompressor(dict_data=dict_data)
+    return cache[key]
+
+def decompress_archive(data, data_dir=DATA_DIR):
+    """Returns data decompressed if it is a gzip or zstd stream, else data unchanged.
+
+    zstd dictionaries are read from data_dir.
+    """
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == ZSTD_MAGIC:
+        return zstd_decompressor(data, data_dir).decompress(data)
+    return data
+
+def read_archive(path, data_dir=None):
+    """Returns the raw companyfacts bytes stored in the archive at path.
+
+    Dictionaries are looked up next to the archive unless data_dir is given.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return decompress_archive(data, data_dir or os.path.dirname(path) or '.')
+
+def load_archive(path, data_dir=None):
+    """Parses the archive at path into a companyfacts dict."""
+    return json.loads(read_archive(path, data_dir))
+
+def train_dictionary(paths, data_dir=DATA_DIR, dict_size=ZSTD_DICT_SIZE, samples=ZSTD_TRAIN_SAMPLES, seed=0):
+    """Trains a zstd dictionary on a random sample of archives and returns its path."""
+    require_zstandard()
+    chosen = random.Random(seed).sample(paths, min(samples, len(paths)))
+    sample_data = [read_archive(path)[:ZSTD_TRAIN_SAMPLE_BYTES] for path in chosen]
+    dictionary = zstandard.train_dictionary(dict_size, sample_data)
+    path = dictionary_path(data_dir, dictionary.dict_id())
+    write_file_atomic(path, dictionary.as_bytes())
+    return path
+
+def recompress_archives(paths, codec):
+    """Rewrites archives with codec; returns (files, bytes before, bytes after)."""
+    before = after = 0
+    for path in paths:
+        raw = read_archive(path)
+        new_path = path
+        for extension in ARCHIVE_EXTENSIONS.values():
+            if path.endswith(extension):
+                new_path = path[:-len(extension)] + codec.extension
+        before += os.path.getsize(path)
+        data = codec.compress(raw)
+        write_file_atomic(new_path, data)
+        remove_other_archives(new_path)
+        after += len(data)
+    return len(paths), before, after
+
+def main():
+    parser = argparse.ArgumentParser(description='Train zstd dictionaries for and recompress the sec_data archives.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help=f'Archive directory (default: {DATA_DIR}).')
+    commands = parser.add_subparsers(dest='command', required=True)
+    train = commands.add_parser('train', help='Train a zstd dictionary on the existing archives.')
+    train.add_argument('--samples', type=int, default=ZSTD_TRAIN_SAMPLES, help=f'Archives to sample (default: {ZSTD_TRAIN_SAMPLES}).')
+    train.add_argument('--dict-size', type=int, default=ZSTD_DICT_SIZE, help=f'Dictionary size in bytes (default: {ZSTD_DICT_SIZE}).')
+    recompress = commands.add_parser('recompress', help='Rewrite every archive with another codec or level.')
+    recompress.add_argument('--codec', choices=sorted(ARCHIVE_EXTENSIONS), default='zstd', help='Target codec (default: zstd).')
+    recompress.add_argument('--level', type=int, help='Compression level (default: gzip 6, zstd 9).')
+    recompress.add_argument('--dict', dest='dict_path', help='zstd dictionary (default: the latest trained one, if any).')
+    args = parser.parse_args()
+
+    paths = list(list_archives(args.data_dir).values())
+    if args.command == 'train':
+        start = time.monotonic()
+        path = train_dictionary(paths, args.data_dir, args.dict_size, args.samples)
+        print(f"Trained {path} on {min(args.samples, len(paths))} archives in {time.monotonic() - start:.1f}s.")
+    else:
+        dict_path = args.dict_path
+        if args.codec == 'zstd' and dict_path is None:
+            dict_path = latest_dictionary(args.data_dir)
+        codec = ArchiveCodec(args.codec, args.level, dict_path, args.data_dir)
+        start = time.monotonic()
+        files, before, after = recompress_archives(paths, codec)
+        mb = 1024 * 1024
+        print(f"Recompressed {files} archives with {codec.describe()} in {time.monotonic() - start:.1f}s: "
+              f"{before / mb:.1f} MB -> {after / mb:.1f} MB.")
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,12 @@ DB_NAME = get_config('DB_NAME', 'nextcloud')
 FINNHUB_API_KEY = get_config('FINNHUB_API_KEY')
 FINNHUB_RATE_LIMIT = int(get_config('FINNHUB_RATE_LIMIT', 30))  # Requests per second
 
+# --- Local Snapshot Cache (see snapshot.py) ---
+SNAPSHOT_DIR = get_config('SNAPSHOT_DIR', 'engine_snapshot')
+
+# --- Incremental Runs (see incremental.py) ---
+INCREMENTAL_STATE_FILE = get_config('INCREMENTAL_STATE_FILE', os.path.join(SNAPSHOT_DIR, 'engine_state.pkl'))
+
 # --- Logging Configuration ---
 LOG_FILE = get_config('LOG_FILE', 'stock_screener.json')
 LOG_LEVEL_CONSOLE = logging.INFO
@@ -5,6 +5,82 @@ from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+def calculate_cagr(end, start, years):
+    """
+    Element-wise CAGR of two Series: (end / start)^(1/years) - 1.
+    NaN where either value is missing, zero or negative.
+    """
+    valid = (start > 0) & (end > 0)
+    return (end / start).where(valid) ** (1 / years) - 1
+
+def calculate_cash_ratio(df):
+    """
+    Cash Ratio per row: cash / total_current_liabilities.
+    Cash is 'cash_and_short_term_investments', falling back to 'cash_and_equivalents'
+    where that is missing. NaN where liabilities are missing or zero.
+    """
+    if 'total_current_liabilities' not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    cash = pd.Series(np.nan, index=df.index)
+    for col in ('cash_and_short_term_investments', 'cash_and_equivalents'):
+        if col in df.columns:
+            cash = cash.fillna(df[col])
+    liabilities = df['total_current_liabilities']
+    return (cash / liabilities).where(liabilities != 0)
+
+# sec_financial_reports columns read by prepare_data and the strategies, plus the filing
+# context kept in the output CSVs (db_client.fetch_financial_reports pulls only these)
+REPORT_COLUMNS = [
+    'cik', 'fiscal_year', 'filing_date', 'form', 'price',
+    'revenue', 'gross_profit', 'gross_margin', 'operating_income', 'interest_expense', 'income_tax_expense',
+    'net_income', 'eps', 'dividend_per_share', 'operating_cash_flow', 'capital_expenditures',
+    'cash_and_equivalents', 'cash_and_short_term_investments', 'total_assets', 'total_current_liabilities',
+    'long_term_debt', 'short_term_borrowings', 'total_liabilities', 'shareholders_equity',
+]
+
+# Lagged columns added by add_lags: source column -> fiscal years back.
+# Lag 1 is named '<col>_prev', lag k is '<col>_<k>y_ago' (see lag_column_name).
+LAG_SPEC = {
+    'eps': [1, 2, 3],
+    'net_income': [1, 2],
+    'revenue': [1, 3],
+    'gross_margin': [1],
+    'total_debt': [1],
+}
+
+def lag_column_name(col, lag):
+    return f"{col}_prev" if lag == 1 else f"{col}_{lag}y_ago"
+
+def add_lags(df, spec=LAG_SPEC):
+    """
+    Adds the lagged columns of `spec` to df, in any row order.
+    A lag of k is the same company's value for fiscal_year - k, so a gap in filings
+    gives NaN instead of an older year's value. The (cik, fiscal_year) index is built
+    and sorted once and each distinct lag is matched once for all columns.
+    """
+    columns = {col: lags for col, lags in spec.items() if col in df.columns}
+    if not columns or df.empty:
+        return df
+
+    codes, _ = pd.factorize(df['cik'])
+    years = df['fiscal_year'].to_numpy(dtype='int64')
+    first_year = years.min()
+    span = years.max() - first_year + 1
+    keys = codes * span + (years - first_year)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    for lag in sorted({lag for lags in columns.values() for lag in lags}):
+        target_years = years - lag
+        target_keys = codes * span + (target_years - first_year)
+        pos = np.minimum(np.searchsorted(sorted_keys, target_keys), len(keys) - 1)
+        found = (target_years >= first_year) & (sorted_keys[pos] == target_keys)
+        rows = order[pos]
+        for col, lags in columns.items():
+            if lag in lags:
+                df[lag_column_name(col, lag)] = pd.Series(df[col].to_numpy()[rows], index=df.index).where(found)
+    return df
+
 def prepare_data(df):
     """
     Prepares the DataFrame for analysis by calculating derived metrics and sorting.
@@ -52,62 +128,42 @@ def prepare_data(df):
     # If using pre-calculated column from DB imports:
     # df['payout_ratio'] = df['Dividend_Payout_Ratio'] 
     
-    # Calculate YoY Growth and shifts for CAGR
-    # Using groupby to ensure shifts don't cross companies
-    
-    # Previous Year EPS
-    df['eps_prev'] = df.groupby('cik')['eps'].shift(1)
-    df['eps_growth_1y'] = (df['eps'] - df['eps_prev']) / df['eps_prev'].abs()
-    
-    # Previous Year Net Income
-    df['net_income_prev'] = df.groupby('cik')['net_income'].shift(1)
-    df['net_income_2y_ago'] = df.groupby('cik')['net_income'].shift(2)
-
-    # Revenue 3 years ago (for 3Y CAGR)
-    # fiscal_year is int. We want to compare row N with row N-3
-    # Shift 3 rows back
-    df['revenue_3y_ago'] = df.groupby('cik')['revenue'].shift(3)
-    
-    # Calculate 3Y Revenue CAGR: (Val_end / Val_start)^(1/3) - 1
-    # Handle negative base values or zeroes
-    def calculate_cagr(end, start, years):
-        if start <= 0 or pd.isna(start) or pd.isna(end) or end <= 0:
-            return np.nan
-        return (end / start)**(1/years) - 1
-    
-    # Vectorized check isn't trivial with power on negative bases, but revenue is usually positive.
-    # Using lambda for simplicity on series
-    df['revenue_cagr_3y'] = df.apply(
-        lambda row: calculate_cagr(row['revenue'], row['revenue_3y_ago'], 3), axis=1
-    )
-
-    # EPS 3Y CAGR (optional based on spec, but good for growth)
-    df['eps_3y_ago'] = df.groupby('cik')['eps'].shift(3)
-    # EPS needed for growth consistency check (positive increase for trailing 3 periods)
-    df['eps_2y_ago'] = df.groupby('cik')['eps'].shift(2)
-    
-    
-    # Turnaround specific:
-    # "two consecutive trailing fiscal years of negative net income"
-    # Current row is T (potential turnaround year). We look at T-1 and T-2.
-    # Wait, the spec says "baseline of historical distress... two consecutive trailing fiscal years of negative"
-    # And "inflection point... transition from negative to positive profitability in the most recent reporting period"
-    # So: T (Current) > 0, T-1 < 0, T-2 < 0
-    
-    # Total Debt Change
+    # Total Debt
     # Assuming 'total_liabilities' or 'long_term_debt' + 'short_term_debt'. Spec says "Total Debt".
     # Using total_liabilities as proxy for leverage if specific debt columns missing, or sum.
     # Let's check available columns. import_all_sec_data_mapping.md has long_term_debt and short_term_debt (added recently short_term_borrowings?)
     # Mapping has `short_term_borrowings` and `long_term_debt`.
-    # df['total_debt'] = df['short_term_borrowings'].fillna(0) + df['long_term_debt'].fillna(0)
-    
     if 'short_term_borrowings' in df.columns and 'long_term_debt' in df.columns:
          df['total_debt'] = df['short_term_borrowings'].fillna(0) + df['long_term_debt'].fillna(0)
-         df['total_debt_prev'] = df.groupby('cik')['total_debt'].shift(1)
-         df['debt_change_yoy'] = (df['total_debt'] - df['total_debt_prev']) / df['total_debt_prev']
     else:
         df['total_debt'] = np.nan
-        df['debt_change_yoy'] = np.nan
+
+    # Gross Margin
+    # Using 'gross_margin' column if available, else derive: gross_profit / revenue
+    if 'gross_margin' not in df.columns:
+         if 'gross_profit' in df.columns and 'revenue' in df.columns:
+             df['gross_margin'] = (df['gross_profit'] / df['revenue'] * 100).where(df['revenue'] != 0)
+         else:
+             df['gross_margin'] = np.nan
+
+    # Prior-year values for YoY growth and CAGR (eps_prev, revenue_3y_ago, ... see LAG_SPEC)
+    add_lags(df)
+
+    # EPS YoY Growth
+    df['eps_growth_1y'] = (df['eps'] - df['eps_prev']) / df['eps_prev'].abs()
+
+    # Calculate 3Y Revenue CAGR: (Val_end / Val_start)^(1/3) - 1
+    df['revenue_cagr_3y'] = calculate_cagr(df['revenue'], df['revenue_3y_ago'], 3)
+
+    # Turnaround specific:
+    # "two consecutive trailing fiscal years of negative net income"
+    # Current row is T (potential turnaround year). We look at T-1 and T-2 (net_income_prev, net_income_2y_ago).
+    # Wait, the spec says "baseline of historical distress... two consecutive trailing fiscal years of negative"
+    # And "inflection point... transition from negative to positive profitability in the most recent reporting period"
+    # So: T (Current) > 0, T-1 < 0, T-2 < 0
+
+    # Total Debt Change
+    df['debt_change_yoy'] = (df['total_debt'] - df['total_debt_prev']) / df['total_debt_prev']
 
     # Calculate EBIT if missing
     if 'ebit' not in df.columns:
@@ -121,45 +177,17 @@ def prepare_data(df):
     # OCF / EBIT
     # Spec: Operating Cash Flow / EBIT
     if 'operating_cash_flow' in df.columns:
-         df['ocf_to_ebit'] = df.apply(lambda row: row['operating_cash_flow'] / row['ebit'] if pd.notna(row.get('ebit')) and row['ebit'] != 0 else np.nan, axis=1)
+         df['ocf_to_ebit'] = (df['operating_cash_flow'] / df['ebit']).where(df['ebit'].notna() & (df['ebit'] != 0))
     else:
          df['ocf_to_ebit'] = np.nan
     
     # Solvency: Debt to Equity (already calculated)
-    
-    # Loss-to-Profit specific metrics:
-    
-    # Revenue Growth (Sequential/YoY)
-    df['revenue_prev'] = df.groupby('cik')['revenue'].shift(1)
-    
-    # Gross Margin Improvement
-    # Using 'gross_margin' column if available, else derive: gross_profit / revenue
-    if 'gross_margin' not in df.columns:
-         if 'gross_profit' in df.columns and 'revenue' in df.columns:
-             df['gross_margin'] = df.apply(lambda row: (row['gross_profit'] / row['revenue'] * 100) if row['revenue'] and row['revenue'] != 0 else np.nan, axis=1)
-         else:
-             df['gross_margin'] = np.nan
-             
-    df['gross_margin_prev'] = df.groupby('cik')['gross_margin'].shift(1)
-    
+
+    # Loss-to-Profit specific metrics (revenue_prev, gross_margin_prev) come from add_lags
+
     # Cash Ratio
     # (Cash + Marketable Securities) / Current Liabilities
-    # Try 'cash_and_short_term_investments' first, then 'cash_and_equivalents'
-    def calculate_cash_ratio(row):
-        liabilities = row.get('total_current_liabilities')
-        if not liabilities or liabilities == 0:
-            return np.nan
-            
-        cash = row.get('cash_and_short_term_investments')
-        if pd.isna(cash):
-            cash = row.get('cash_and_equivalents')
-            
-        if pd.isna(cash):
-            return np.nan
-            
-        return cash / liabilities
-
-    df['cash_ratio'] = df.apply(calculate_cash_ratio, axis=1)
+    df['cash_ratio'] = calculate_cash_ratio(df)
 
     # Accrual Ratio
     # (Net Income - OCF) / Total Assets
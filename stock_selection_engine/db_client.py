@@ -1,11 +1,23 @@
 
 import mariadb
+from mariadb.constants import FIELD_TYPE
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from . import config
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Rows pulled from the server per fetchmany() while streaming sec_financial_reports
+FETCH_CHUNK_SIZE = 10000
+
+# How MariaDB column types are stored in the DataFrame
+FLOAT_TYPES = {FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE}
+INT_TYPES = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.INT24, FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR}
+STRING_TYPES = {FIELD_TYPE.VARCHAR, FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING}
+DATE_TYPES = {FIELD_TYPE.DATE, FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP}
+
 def get_connection():
     """Establishes and returns a database connection."""
     try:
@@ -38,25 +50,133 @@ def fetch_all_companies():
     finally:
         conn.close()
 
-def fetch_all_financial_reports():
-    """Fetches all financial reports from the database."""
+def column_kind(description):
+    """Maps a cursor.description entry to 'float', 'int', 'category', 'datetime' or 'object'."""
+    type_code, null_ok = description[1], description[6]
+    if type_code in FLOAT_TYPES:
+        return 'float'
+    if type_code in INT_TYPES:
+        # Nullable integers become float64 (NaN), as pandas would do
+        return 'float' if null_ok else 'int'
+    if type_code in STRING_TYPES:
+        return 'category'
+    if type_code in DATE_TYPES:
+        return 'datetime'
+    return 'object'
+
+def convert_chunk(values, kind):
+    """Converts one column of a fetched chunk (a tuple of Python values) to its final dtype."""
+    if kind == 'float':
+        return np.array(values, dtype='float64') # Decimal -> float, None -> NaN
+    if kind == 'int':
+        return np.array(values, dtype='int64')
+    if kind == 'category':
+        return pd.Categorical(values)
+    return np.array(values, dtype=object)
+
+def combine_chunks(chunks, kind):
+    if kind == 'category':
+        return union_categoricals(chunks, sort_categories=True) if chunks else pd.Categorical([])
+    combined = np.concatenate(chunks) if chunks else np.array([], dtype='float64' if kind == 'float' else object)
+    if kind == 'datetime':
+        return pd.to_datetime(combined)
+    return combined
+
+def fetch_financial_reports(columns=None, chunk_size=FETCH_CHUNK_SIZE, updated_since=None):
+    """
+    Fetches sec_financial_reports with only `columns` (all columns if None).
+    Rows are streamed from the server in chunks with an unbuffered cursor and converted
+    while reading: DECIMAL to float64, varchar to categorical, dates to datetime64.
+    With `updated_since`, only rows whose updated_at is at or after it are fetched.
+    """
     conn = get_connection()
     if not conn:
         return pd.DataFrame()
 
+    cursor = None
     try:
-        # Fetching all columns. We handle CIK padding here if necessary, though spec says DB has it.
-        # Note: Spec says sec_financial_reports has padded CIKs, sec_companies might not.
-        query = "SELECT * FROM sec_financial_reports"
-        logger.info("Starting bulk fetch of financial reports...", extra={'ticker': 'ALL', 'module_name': 'db_client'})
-        
-        # Using chunksize if data is huge, but for now loading all to DF as per spec optimization
-        df = pd.read_sql(query, conn)
-        
-        logger.info(f"Fetched {len(df)} financial records from database.", extra={'ticker': 'ALL', 'module_name': 'db_client'})
+        column_list = ', '.join(f"`{c}`" for c in columns) if columns else '*'
+        query = f"SELECT {column_list} FROM sec_financial_reports"
+        params = ()
+        if updated_since is not None:
+            query += " WHERE updated_at >= ?"
+            params = (updated_since,)
+        logger.info(f"Starting streamed fetch of financial reports ({len(columns) if columns else 'all'} columns)...", extra={'ticker': 'ALL', 'module_name': 'db_client'})
+
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+        names = [d[0] for d in cursor.description]
+        kinds = [column_kind(d) for d in cursor.description]
+        chunks = [[] for _ in names]
+        rows = 0
+        while True:
+            batch = cursor.fetchmany(chunk_size)
+            if not batch:
+                break
+            rows += len(batch)
+            for i, values in enumerate(zip(*batch)):
+                chunks[i].append(convert_chunk(values, kinds[i]))
+            del batch
+
+        df = pd.DataFrame({name: combine_chunks(chunks[i], kinds[i]) for i, name in enumerate(names)})
+        mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        logger.info(f"Fetched {rows} financial records from database ({mb:.1f} MB in memory).", extra={'ticker': 'ALL', 'module_name': 'db_client'})
         return df
     except Exception as e:
         logger.exception(f"Error fetching financial reports: {e}", extra={'ticker': 'ALL', 'module_name': 'db_client'})
         return pd.DataFrame()
     finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+def fetch_all_financial_reports():
+    """Fetches all financial reports (every column) from the database."""
+    return fetch_financial_reports()
+
+def fetch_table_state(table, watermark_column=None):
+    """
+    Returns a dict describing the current contents of `table` for change detection:
+    'rows' plus 'watermark' (MAX(watermark_column)) if given, else 'checksum' (CHECKSUM TABLE).
+    Returns None if the database cannot be queried.
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+
+    cursor = conn.cursor()
+    try:
+        if watermark_column:
+            cursor.execute(f"SELECT COUNT(*), MAX(`{watermark_column}`) FROM {table}")
+            rows, watermark = cursor.fetchone()
+            return {'rows': rows, 'watermark': watermark.isoformat() if watermark else None}
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        rows = cursor.fetchone()[0]
+        cursor.execute(f"CHECKSUM TABLE {table}")
+        return {'rows': rows, 'checksum': cursor.fetchone()[1]}
+    except mariadb.Error as e:
+        logger.error(f"Error reading state of {table}: {e}", extra={'ticker': 'ALL', 'module_name': 'db_client'})
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+def fetch_updated_ciks(since):
+    """
+    Returns the set of CIKs with a sec_financial_reports row updated at or after `since`.
+    Returns None if the database cannot be queried.
+    """
+    conn = get_connection()
+    if not conn:
+        return None
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT DISTINCT cik FROM sec_financial_reports WHERE updated_at >= ?", (since,))
+        return {row[0] for row in cursor.fetchall()}
+    except mariadb.Error as e:
+        logger.error(f"Error fetching updated CIKs: {e}", extra={'ticker': 'ALL', 'module_name': 'db_client'})
+        return None
+    finally:
+        cursor.close()
         conn.close()
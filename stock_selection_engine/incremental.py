@@ -0,0 +1,189 @@
+import datetime
+import os
+import numpy as np
+import pandas as pd
+from . import config
+from . import db_client
+from . import data_processor
+from .snapshot import restore_categoricals
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+STATE_VERSION = 1
+# A CIK whose set of these rows differs from the previous run is recomputed (new, removed or re-keyed reports)
+KEY_COLUMNS = ['cik', 'fiscal_year', 'ticker', 'company_name']
+# Per strategy and CIK: the candidate report's year and ticker, and 'pass' (in the portfolio)
+# or 'rejected' (screened in, dropped during enrichment). CIKs that fail the screen are absent.
+OUTCOME_COLUMNS = ['cik', 'fiscal_year', 'ticker', 'status']
+THRESHOLD_PREFIXES = ('GROWTH_', 'DIVIDEND_', 'TURNAROUND_', 'LOSS_TO_PROFIT_')
+
+def strategy_thresholds():
+    """Strategy thresholds from config; saved outcomes are only reused with the same values."""
+    return {key: value for key, value in vars(config).items() if key.startswith(THRESHOLD_PREFIXES)}
+
+def read_state(path):
+    """Returns the state saved by the previous incremental run, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_pickle(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable incremental state {path}: {e}", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+        return None
+
+def write_state(path, state):
+    """Writes the state atomically (temp file + rename)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    try:
+        pd.to_pickle(state, temp_path)
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.error(f"Error saving incremental state: {e}", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def changed_ciks(df, previous):
+    """CIKs whose KEY_COLUMNS rows differ between df and the previous prepared frame."""
+    columns = [c for c in KEY_COLUMNS if c in df.columns and c in previous.columns]
+    merged = df[columns].drop_duplicates().merge(previous[columns].drop_duplicates(), how='outer', indicator=True)
+    return set(merged.loc[merged['_merge'] != 'both', 'cik'])
+
+def ordered_columns(frames):
+    return list(dict.fromkeys(c for frame in frames for c in frame.columns))
+
+class IncrementalRun:
+    """
+    Reuses the previous run's prepared frame, strategy outcomes and enriched results
+    (INCREMENTAL_STATE_FILE) for CIKs whose reports did not change.
+
+    A CIK is dirty if a report row was updated since the previous run's updated_at
+    watermark, or its (cik, fiscal_year, ticker, company_name) rows changed. Only dirty
+    CIKs go through prepare_data and the strategy screens, and only candidates whose
+    status changed are enriched through the API again.
+
+    Create it before fetching the reports, so rows updated while the run is in progress
+    are picked up by the next run. With `offline`, the database is not contacted and
+    every CIK is recomputed, but unchanged candidates still keep their enrichment.
+    """
+
+    def __init__(self, columns, full=False, offline=False, path=None):
+        self.path = path or config.INCREMENTAL_STATE_FILE
+        self.offline = offline
+        self.meta = {'version': STATE_VERSION, 'columns': columns, 'thresholds': strategy_thresholds()}
+        table_state = None if offline else db_client.fetch_table_state('sec_financial_reports', watermark_column='updated_at')
+        # Unknown watermark: the next run recomputes everything
+        self.watermark = table_state['watermark'] if table_state else None
+        self.previous = None if full else self.load_previous()
+        self.ciks = set()
+        self.dirty = set()
+        self.prepared = None
+        self.dirty_df = None
+        self.outcomes = {}
+        self.results = {}
+
+    def load_previous(self):
+        state = read_state(self.path)
+        if state is None:
+            logger.info("No incremental state yet; computing every CIK.", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+            return None
+        if state['meta'] != self.meta:
+            logger.info("Report columns or strategy thresholds changed since the last run; computing every CIK.", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+            return None
+        return state
+
+    def find_dirty(self, df):
+        """Returns the CIKs of df to recompute."""
+        if self.previous is None:
+            return set(self.ciks)
+        updated = None
+        if self.previous['watermark'] and not self.offline:
+            since = datetime.datetime.fromisoformat(self.previous['watermark'])
+            updated = db_client.fetch_updated_ciks(since)
+        if updated is None:
+            logger.warning("Cannot tell which reports changed since the last run; computing every CIK.", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+            return set(self.ciks)
+        updated = {str(cik).zfill(10) for cik in updated}
+        return (updated | changed_ciks(df, self.previous['prepared'])) & self.ciks
+
+    def prepare(self, df):
+        """Returns the prepared frame; prepare_data runs only on the dirty CIKs."""
+        self.ciks = set(df['cik'])
+        self.dirty = self.find_dirty(df)
+        fresh = data_processor.prepare_data(df[df['cik'].isin(self.dirty)].copy())
+        if self.previous is None:
+            self.prepared = fresh
+        else:
+            previous = self.previous['prepared']
+            kept = previous[previous['cik'].isin(self.ciks - self.dirty)]
+            parts = [part for part in (kept, fresh) if not part.empty]
+            self.prepared = pd.concat(parts) if parts else kept
+            restore_categoricals(self.prepared, kept)
+            self.prepared.sort_values(by=['cik', 'fiscal_year'], inplace=True)
+            logger.info(f"Incremental run: {len(self.dirty)} of {len(self.ciks)} CIKs changed since {self.previous['watermark']}; reused {len(kept)} prepared rows.", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+        # Strategies screen this frame; turnaround adds a column to it, which must not reach the saved state
+        self.dirty_df = self.prepared[self.prepared['cik'].isin(self.dirty)].copy()
+        return self.prepared
+
+    def filter(self, name, strategy, api_client):
+        """
+        Runs `strategy` (a module with screen and enrich) on the dirty CIKs and splices
+        the result into the previous run's. A candidate is enriched again only if it is
+        new or its latest report year or ticker changed; otherwise it keeps the previous
+        run's enrichment (or rejection).
+        """
+        previous_outcomes = pd.DataFrame(columns=OUTCOME_COLUMNS).set_index('cik')
+        previous_results = pd.DataFrame(columns=['cik'])
+        if self.previous is not None:
+            previous_outcomes = self.previous['outcomes'].get(name, previous_outcomes)
+            previous_results = self.previous['results'].get(name, previous_results)
+            if previous_results.empty:
+                previous_results = pd.DataFrame(columns=['cik'])
+
+        clean_ciks = self.ciks - self.dirty
+        kept_outcomes = previous_outcomes[previous_outcomes.index.isin(clean_ciks)]
+        kept_results = previous_results[previous_results['cik'].isin(clean_ciks)]
+
+        candidates = strategy.screen(self.dirty_df)
+        if candidates.empty:
+            candidates = pd.DataFrame(columns=['cik', 'fiscal_year', 'ticker'])
+        status = candidates[['cik', 'fiscal_year', 'ticker']].set_index('cik')
+        before = previous_outcomes.reindex(status.index)
+        unchanged = (before['fiscal_year'] == status['fiscal_year']) & (before['ticker'] == status['ticker'])
+        reuse = unchanged & (before['status'] == 'pass')
+        reuse_ciks = set(reuse.index[reuse])
+
+        # Unchanged candidates: fresh report values, previous enrichment columns
+        reused = candidates[candidates['cik'].isin(reuse_ciks)]
+        if reuse_ciks:
+            enrichment = previous_results.set_index('cik')
+            extra = [c for c in enrichment.columns if c not in candidates.columns]
+            reused = reused.join(enrichment[extra], on='cik')
+
+        to_enrich = candidates[candidates['cik'].isin(set(unchanged.index[~unchanged]))]
+        enriched = strategy.enrich(to_enrich, api_client) if not to_enrich.empty else pd.DataFrame()
+        passed = reuse_ciks | (set(enriched['cik']) if not enriched.empty else set())
+        status['status'] = np.where(status.index.isin(passed), 'pass', 'rejected')
+        logger.info(f"{name}: {len(status)} candidates among {len(self.dirty)} changed CIKs; enriched {len(to_enrich)}, reused {len(status) - len(to_enrich)}.", extra={'ticker': 'ALL', 'module_name': 'incremental'})
+
+        parts = [part for part in (kept_results, reused, enriched) if not part.empty]
+        results = pd.DataFrame()
+        if parts:
+            results = pd.concat(parts)[ordered_columns(parts)]
+            results = results.sort_values(by='cik', kind='stable').reset_index(drop=True)
+        self.outcomes[name] = pd.concat([part for part in (kept_outcomes, status) if not part.empty] or [kept_outcomes])
+        self.results[name] = results
+        return results
+
+    def save(self):
+        """Saves the prepared frame, outcomes and results for the next run."""
+        write_state(self.path, {
+            'meta': self.meta,
+            'watermark': self.watermark,
+            'saved_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'prepared': self.prepared,
+            'outcomes': self.outcomes,
+            'results': self.results,
+        })
+        logger.info(f"Saved incremental state to {self.path} (watermark {self.watermark}).", extra={'ticker': 'ALL', 'module_name': 'incremental'})
@@ -5,12 +5,22 @@ import pandas as pd
 from . import config
 from .logger import setup_logger
 from . import db_client
+from . import snapshot
+from . import incremental
 from . import api_client
 from . import data_processor
 from .strategies import growth, dividend, turnaround, loss_to_profit
 
 logger = setup_logger(__name__)
 
+# (name, strategy module, output file), in the order they run
+STRATEGIES = [
+    ('growth', growth, 'output_growth_stocks.csv'),
+    ('dividend', dividend, 'output_dividend_stocks.csv'),
+    ('turnaround', turnaround, 'output_turnaround_stocks.csv'),
+    ('loss_to_profit', loss_to_profit, 'output_loss_to_profit_stocks.csv'),
+]
+
 def save_to_csv(df, filename):
     """Saves DataFrame to CSV with atomic write."""
     if df.empty:
@@ -27,9 +37,20 @@ def save_to_csv(df, filename):
         if os.path.exists(temp_filename):
             os.remove(temp_filename)
 
+def pad_cik(cik):
+    """Zero-pads CIKs to 10 digits; a categorical column stays categorical, only its categories are padded."""
+    if isinstance(cik.dtype, pd.CategoricalDtype):
+        return cik.cat.rename_categories(lambda c: str(c).zfill(10))
+    return cik.astype(str).str.zfill(10)
+
 def main():
     parser = argparse.ArgumentParser(description='Multi-Strategy Quantitative Stock Selection Engine')
     parser.add_argument('--limit', type=int, help='Limit number of tickers for testing')
+    parser.add_argument('--all-columns', action='store_true', help='Fetch every sec_financial_reports column instead of only those the strategies use')
+    parser.add_argument('--offline', action='store_true', help='Use the local snapshot only, without contacting the database')
+    parser.add_argument('--no-snapshot', action='store_true', help='Read straight from the database, bypassing the local snapshot')
+    parser.add_argument('--incremental', action='store_true', help='Recompute only companies whose reports changed since the last incremental run')
+    parser.add_argument('--full', action='store_true', help='With --incremental, recompute every company and refresh all API enrichment')
     args = parser.parse_args()
 
     logger.info("Initializing Stock Selection Engine...", extra={'ticker': 'N/A', 'module_name': 'main'})
@@ -39,16 +60,28 @@ def main():
 
     # 2. Bulk Extraction
     logger.info("Step 1: Bulk Data Extraction", extra={'ticker': 'N/A', 'module_name': 'main'})
-    companies_df = db_client.fetch_all_companies()
-    financials_df = db_client.fetch_all_financial_reports()
+    columns = None if args.all_columns else data_processor.REPORT_COLUMNS
+    # Reads the updated_at watermark before the reports, so later updates are seen next run
+    run = incremental.IncrementalRun(columns, full=args.full, offline=args.offline) if args.incremental else None
+    if args.no_snapshot:
+        companies_df = db_client.fetch_all_companies()
+        financials_df = db_client.fetch_financial_reports(columns)
+    else:
+        companies_df = snapshot.load_companies(offline=args.offline)
+        financials_df = snapshot.load_financial_reports(columns, offline=args.offline)
 
     # Merge company info (ticker) into financials if not present
     # financials_df has cik. companies_df has cik, ticker.
     # Ensure CIK types match
     if 'cik' in companies_df.columns and 'cik' in financials_df.columns:
          # Normalize CIKs? DB load typically handles types but good to ensure
-         companies_df['cik'] = companies_df['cik'].astype(str).str.zfill(10)
-         financials_df['cik'] = financials_df['cik'].astype(str).str.zfill(10)
+         financials_df['cik'] = pad_cik(financials_df['cik'])
+         companies_df['cik'] = pad_cik(companies_df['cik'])
+         if isinstance(financials_df['cik'].dtype, pd.CategoricalDtype):
+             # Same categories on both sides, so the merged cik stays categorical
+             categories = financials_df['cik'].cat.categories
+             companies_df = companies_df[companies_df['cik'].isin(categories)]
+             companies_df = companies_df.assign(cik=pd.Categorical(companies_df['cik'].astype(str), categories=categories))
          
          # Merge
          df = pd.merge(financials_df, companies_df[['cik', 'ticker', 'company_name']], on='cik', how='left')
@@ -63,27 +96,23 @@ def main():
 
     # 3. Data Processing
     logger.info("Step 2: Vectorized Data Transformation", extra={'ticker': 'N/A', 'module_name': 'main'})
-    df = data_processor.prepare_data(df)
+    if run:
+        df = run.prepare(df)
+    else:
+        df = data_processor.prepare_data(df)
 
     # 4. Strategy Execution
     logger.info("Step 3: Executing Quantitative Strategies", extra={'ticker': 'N/A', 'module_name': 'main'})
     
-    # Growth
-    growth_results = growth.filter(df, client)
-    save_to_csv(growth_results, 'output_growth_stocks.csv')
-
-    # Dividend
-    dividend_results = dividend.filter(df, client)
-    save_to_csv(dividend_results, 'output_dividend_stocks.csv')
-
-    # Turnaround
-    turnaround_results = turnaround.filter(df, client)
-    save_to_csv(turnaround_results, 'output_turnaround_stocks.csv')
-
-    # Loss-to-Profit
-    # New strategy added
-    loss_to_profit_results = loss_to_profit.filter(df, client)
-    save_to_csv(loss_to_profit_results, 'output_loss_to_profit_stocks.csv')
+    for name, strategy, filename in STRATEGIES:
+        if run:
+            results = run.filter(name, strategy, client)
+        else:
+            results = strategy.filter(df, client)
+        save_to_csv(results, filename)
+
+    if run:
+        run.save()
 
     logger.info("Stock Selection Engine execution completed.", extra={'ticker': 'N/A', 'module_name': 'main'})
 
@@ -0,0 +1,152 @@
+import datetime
+import json
+import os
+import pandas as pd
+from . import config
+from . import db_client
+from .logger import setup_logger
+try:
+    import pyarrow  # noqa: F401 (Parquet engine)
+except ImportError:
+    pyarrow = None
+
+logger = setup_logger(__name__)
+
+COMPANIES = 'sec_companies'
+REPORTS = 'sec_financial_reports'
+REPORT_KEY = ['cik', 'fiscal_year']
+
+def snapshot_paths(table):
+    """Returns (parquet path, metadata JSON path) of a table's snapshot."""
+    base = os.path.join(config.SNAPSHOT_DIR, table)
+    return base + '.parquet', base + '.json'
+
+def read_snapshot(table):
+    """Returns (DataFrame, metadata) of a table's snapshot, or (None, None) if there is none."""
+    data_path, meta_path = snapshot_paths(table)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None, None
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        return pd.read_parquet(data_path), meta
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot of {table}: {e}", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        return None, None
+
+def write_snapshot(table, df, meta):
+    """Writes a table's snapshot and metadata atomically (temp file + rename)."""
+    os.makedirs(config.SNAPSHOT_DIR, exist_ok=True)
+    data_path, meta_path = snapshot_paths(table)
+    meta = dict(meta, saved_at=datetime.datetime.now().isoformat(timespec='seconds'), snapshot_rows=len(df))
+    try:
+        df.to_parquet(data_path + '.tmp', index=False)
+        os.replace(data_path + '.tmp', data_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_path + '.tmp', meta_path)
+    except Exception as e:
+        logger.error(f"Error saving snapshot of {table}: {e}", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        for path in (data_path + '.tmp', meta_path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+def restore_categoricals(df, like):
+    """Re-applies categorical dtypes of `like`, which concat drops when categories differ."""
+    for col, dtype in like.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def use_snapshot_or_fetch(table, fetch, offline):
+    """
+    Shared start of the loaders: returns (snapshot, meta, result), where a non-None
+    result is the frame to return without consulting the snapshot state
+    (--offline, or snapshots disabled because pyarrow is missing).
+    """
+    cached, meta = read_snapshot(table)
+    if offline:
+        if cached is None:
+            logger.error(f"--offline given but there is no snapshot of {table} in {config.SNAPSHOT_DIR}.", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+            return cached, meta, pd.DataFrame()
+        logger.info(f"Using {table} snapshot from {meta.get('saved_at')} ({len(cached)} rows, offline).", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        return cached, meta, cached
+    if pyarrow is None:
+        logger.warning("pyarrow is not installed; snapshots are disabled (pip install pyarrow).", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        return cached, meta, fetch()
+    return cached, meta, None
+
+def load_companies(offline=False):
+    """
+    Returns sec_companies (cik, ticker, company_name) from the local snapshot.
+    The snapshot is tagged with the row count and CHECKSUM TABLE and re-pulled whole
+    when either changes (the table has no updated_at). If the database cannot be
+    reached, the snapshot is used as is.
+    """
+    cached, meta, result = use_snapshot_or_fetch(COMPANIES, db_client.fetch_all_companies, offline)
+    if result is not None:
+        return result
+
+    state = db_client.fetch_table_state(COMPANIES)
+    if state is None:
+        return stale_snapshot(COMPANIES, cached, meta)
+    if cached is not None and meta.get('state') == state:
+        logger.info(f"{COMPANIES} unchanged; using snapshot ({len(cached)} rows).", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        return cached
+
+    df = db_client.fetch_all_companies()
+    if df.empty and state['rows']:
+        return stale_snapshot(COMPANIES, cached, meta)
+    write_snapshot(COMPANIES, df, {'state': state})
+    return df
+
+def load_financial_reports(columns=None, offline=False):
+    """
+    Returns sec_financial_reports (only `columns`, or all if None) from the local snapshot.
+    The snapshot is tagged with MAX(updated_at) and the row count. When the watermark
+    moves, only rows updated since the old watermark are fetched and merged on
+    (cik, fiscal_year); the whole table is re-pulled if the merged row count does not
+    match (rows were deleted) or the column set changed. If the database cannot be
+    reached, the snapshot is used as is.
+    """
+    fetch_all = lambda: db_client.fetch_financial_reports(columns)
+    cached, meta, result = use_snapshot_or_fetch(REPORTS, fetch_all, offline)
+    if result is not None:
+        return result
+
+    state = db_client.fetch_table_state(REPORTS, watermark_column='updated_at')
+    if state is None:
+        return stale_snapshot(REPORTS, cached, meta)
+
+    usable = cached is not None and meta.get('columns') == columns and meta['state'].get('watermark')
+    if usable and meta['state'] == state:
+        logger.info(f"{REPORTS} unchanged since {state['watermark']}; using snapshot ({len(cached)} rows).", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        return cached
+
+    df = None
+    if usable:
+        # >= re-fetches rows updated in the watermark's own second; the merge de-duplicates them
+        since = datetime.datetime.fromisoformat(meta['state']['watermark'])
+        delta = db_client.fetch_financial_reports(columns, updated_since=since)
+        merged = pd.concat([cached, delta], ignore_index=True)
+        merged = merged.drop_duplicates(subset=REPORT_KEY, keep='last').reset_index(drop=True)
+        if len(merged) == state['rows']:
+            df = restore_categoricals(merged, cached)
+            logger.info(f"Merged {len(delta)} changed {REPORTS} rows into snapshot (watermark {state['watermark']}).", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        else:
+            logger.info(f"{REPORTS} row count changed to {state['rows']} (snapshot {len(merged)}); re-pulling the table.", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+
+    if df is None:
+        df = fetch_all()
+        if df.empty and state['rows']:
+            return stale_snapshot(REPORTS, cached, meta)
+    write_snapshot(REPORTS, df, {'state': state, 'columns': columns})
+    return df
+
+def stale_snapshot(table, cached, meta):
+    """Falls back to the existing snapshot when the database is unavailable."""
+    if cached is None:
+        logger.error(f"Cannot read {table} from the database and there is no snapshot.", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+        return pd.DataFrame()
+    logger.warning(f"Database unavailable; using {table} snapshot from {meta.get('saved_at')} ({len(cached)} rows).", extra={'ticker': 'ALL', 'module_name': 'snapshot'})
+    return cached
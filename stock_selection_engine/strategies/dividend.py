@@ -5,9 +5,10 @@ from ..logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def filter(df, api_client):
+def screen(df):
     """
-    Filters stocks for Healthy Dividend Strategy.
+    Applies the Healthy Dividend Strategy filters to the report data.
+    Returns the latest passing report per CIK, before the yield check and enrichment.
     """
     logger.info("Starting Dividend Strategy filtering...", extra={'ticker': 'ALL', 'module_name': 'strategies.dividend'})
     
@@ -28,7 +29,13 @@ def filter(df, api_client):
                          (div_df['payout_calc'] < config.DIVIDEND_MAX_PAYOUT_RATIO)]
     
     # Process latest year for candidates
-    candidates = div_df.groupby('cik').tail(1)
+    return div_df.groupby('cik').tail(1)
+
+def enrich(candidates, api_client):
+    """
+    Keeps screened candidates whose Finnhub dividend yield is above the threshold
+    and enriches them; returns the Dividend Portfolio.
+    """
     final_candidates = []
 
     for index, row in candidates.iterrows():
@@ -59,3 +66,9 @@ def filter(df, api_client):
             logger.error(f"Error processing {ticker} for dividend: {e}", extra={'ticker': ticker, 'module_name': 'strategies.dividend'})
 
     return pd.DataFrame(final_candidates)
+
+def filter(df, api_client):
+    """
+    Filters stocks for Healthy Dividend Strategy.
+    """
+    return enrich(screen(df), api_client)
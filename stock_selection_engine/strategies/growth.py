@@ -5,9 +5,10 @@ from ..logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def filter(df, api_client):
+def screen(df):
     """
-    Filters stocks for Growth Strategy.
+    Applies the Growth Strategy filters to the report data.
+    Returns the latest passing report per CIK, before API enrichment.
     """
     logger.info("Starting Growth Strategy filtering...", extra={'ticker': 'ALL', 'module_name': 'strategies.growth'})
     
@@ -25,8 +26,12 @@ def filter(df, api_client):
     
     # Sort and deduplicate to get latest reports
     growth_df = growth_df.sort_values(by=['cik', 'fiscal_year'], ascending=[True, False])
-    latest_reports = growth_df.drop_duplicates(subset=['cik'], keep='first')
-    
+    return growth_df.drop_duplicates(subset=['cik'], keep='first')
+
+def enrich(latest_reports, api_client):
+    """
+    Enriches screened candidates with Finnhub data; returns the Growth Portfolio.
+    """
     final_candidates = []
 
     for index, row in latest_reports.iterrows():
@@ -65,3 +70,9 @@ def filter(df, api_client):
             logger.error(f"Error processing {ticker}: {e}", extra={'ticker': ticker, 'module_name': 'strategies.growth'})
             
     return pd.DataFrame(final_candidates)
+
+def filter(df, api_client):
+    """
+    Filters stocks for Growth Strategy.
+    """
+    return enrich(screen(df), api_client)
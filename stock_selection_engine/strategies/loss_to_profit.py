@@ -5,9 +5,10 @@ from ..logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def filter(df, api_client):
+def screen(df):
     """
-    Filters stocks for Loss-to-Profit Strategy.
+    Applies the Loss-to-Profit Strategy filters to the report data.
+    Returns the latest passing report per CIK, before API enrichment.
     Criteria:
     1. Net Income Transition: Current > 0, Previous < 0
     2. Operational Validation: Revenue Growth (Current > Previous), Gross Margin Improvement (Current > Previous)
@@ -44,8 +45,6 @@ def filter(df, api_client):
     solvency_df = solvency_df[solvency_df['cash_ratio'] > min_cash_ratio]
     logger.debug(f"Stocks passing Cash Ratio check: {len(solvency_df)}", extra={'ticker': 'ALL', 'module_name': 'strategies.loss_to_profit'})
 
-    # API Enrichment
-    final_candidates = []
     # Using only the latest year for each CIK if duplicates exist (though calc logic suggests df might have multiple years per company, we usually want the LATEST fiscal year for screening)
     # The main script usually prepares data but might not strictly filter for "only latest year" before passing to strategies.
     # Standard practice: Take the latest fiscal year for each CIK that passed filters.
@@ -56,6 +55,13 @@ def filter(df, api_client):
     latest_reports = solvency_df.drop_duplicates(subset=['cik'], keep='first')
     
     logger.info(f"Final candidates before API enrichment: {len(latest_reports)}", extra={'ticker': 'ALL', 'module_name': 'strategies.loss_to_profit'})
+    return latest_reports
+
+def enrich(latest_reports, api_client):
+    """
+    Enriches screened candidates with Finnhub data; returns the Loss-to-Profit Portfolio.
+    """
+    final_candidates = []
 
     for index, row in latest_reports.iterrows():
         ticker = row['ticker']
@@ -96,3 +102,9 @@ def filter(df, api_client):
                  final_candidates.append(row)
 
     return pd.DataFrame(final_candidates)
+
+def filter(df, api_client):
+    """
+    Filters stocks for Loss-to-Profit Strategy.
+    """
+    return enrich(screen(df), api_client)
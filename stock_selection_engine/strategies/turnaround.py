@@ -5,9 +5,10 @@ from ..logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def filter(df, api_client):
+def screen(df):
     """
-    Filters stocks for Earnings Turnaround Strategy.
+    Applies the Earnings Turnaround Strategy filters to the report data.
+    Returns the latest passing report per CIK, before API enrichment.
     """
     logger.info("Starting Turnaround Strategy filtering...", extra={'ticker': 'ALL', 'module_name': 'strategies.turnaround'})
     
@@ -37,7 +38,12 @@ def filter(df, api_client):
     
     # Finalize
     # Get latest data per ticker (should be the turnaround year)
-    candidates = candidates_df.groupby('cik').tail(1)
+    return candidates_df.groupby('cik').tail(1)
+
+def enrich(candidates, api_client):
+    """
+    Enriches screened candidates with the Finnhub profile; returns the Turnaround Portfolio.
+    """
     final_candidates = []
     
     for index, row in candidates.iterrows():
@@ -55,3 +61,9 @@ def filter(df, api_client):
              logger.error(f"Error processing {ticker}: {e}", extra={'ticker': ticker, 'module_name': 'strategies.turnaround'})
              
     return pd.DataFrame(final_candidates)
+
+def filter(df, api_client):
+    """
+    Filters stocks for Earnings Turnaround Strategy.
+    """
+    return enrich(screen(df), api_client)
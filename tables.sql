@@ -80,4 +80,72 @@ CREATE TABLE `sec_financial_reports` (
   `shell_company_flag` tinyint(1) DEFAULT NULL,
   PRIMARY KEY (`cik`,`fiscal_year`),
   KEY `cik` (`cik`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
\ No newline at end of file
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- nextcloud.sec_financial_report_rejects definition
+-- Values quarantined by import_all_sec_data.py --invalid-values quarantine
+
+CREATE TABLE `sec_financial_report_rejects` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `table_name` varchar(64) NOT NULL DEFAULT 'sec_financial_reports',
+  `cik` varchar(10) DEFAULT NULL,
+  `fiscal_year` int(11) DEFAULT NULL,
+  `column_name` varchar(64) NOT NULL,
+  `value` varchar(255) DEFAULT NULL,
+  `reason` varchar(100) DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `cik` (`cik`, `fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- nextcloud.sec_quarterly_reports definition
+-- De-cumulated 10-Q/10-K quarters written by import_all_sec_data.py
+
+CREATE TABLE `sec_quarterly_reports` (
+  `cik` varchar(10) NOT NULL,
+  `fiscal_year` int(11) NOT NULL,
+  `fiscal_quarter` tinyint(4) NOT NULL,
+  `period_end` date DEFAULT NULL,
+  `form` varchar(20) DEFAULT NULL,
+  `filing_date` date DEFAULT NULL,
+  `revenue` decimal(19,4) DEFAULT NULL,
+  `cost_of_revenue` decimal(19,4) DEFAULT NULL,
+  `gross_profit` decimal(19,4) DEFAULT NULL,
+  `operating_income` decimal(19,4) DEFAULT NULL,
+  `net_income` decimal(19,4) DEFAULT NULL,
+  `eps` decimal(10,4) DEFAULT NULL,
+  `interest_expense` decimal(19,4) DEFAULT NULL,
+  `operating_cash_flow` decimal(19,4) DEFAULT NULL,
+  `capital_expenditures` decimal(19,4) DEFAULT NULL,
+  `total_assets` decimal(19,4) DEFAULT NULL,
+  `total_liabilities` decimal(19,4) DEFAULT NULL,
+  `shareholders_equity` decimal(19,4) DEFAULT NULL,
+  `cash_and_equivalents` decimal(19,4) DEFAULT NULL,
+  `long_term_debt` decimal(19,4) DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  `updated_at` timestamp NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`cik`,`fiscal_year`,`fiscal_quarter`),
+  KEY `cik` (`cik`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- nextcloud.sec_facts definition
+-- Every companyfacts fact, loaded by import_all_sec_data.py --store-facts and read by --rederive
+
+CREATE TABLE `sec_facts` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `cik` varchar(10) NOT NULL,
+  `taxonomy` varchar(32) NOT NULL,
+  `tag` varchar(255) NOT NULL,
+  `unit` varchar(64) NOT NULL,
+  `fy` int(11) DEFAULT NULL,
+  `fp` varchar(4) DEFAULT NULL,
+  `start` date DEFAULT NULL,
+  `end` date DEFAULT NULL,
+  `val` double DEFAULT NULL,
+  `accn` varchar(25) DEFAULT NULL,
+  `form` varchar(20) DEFAULT NULL,
+  `filed` date DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `cik` (`cik`),
+  KEY `tag` (`tag`, `fp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -0,0 +1,63 @@
+"""add_lags matches each row to the same company's earlier fiscal years."""
+import numpy as np
+import pandas as pd
+
+from stock_selection_engine.data_processor import add_lags
+
+SPEC = {'eps': [1, 2], 'revenue': [1]}
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['cik', 'fiscal_year', 'eps', 'revenue'])
+
+def lags_by_key(df):
+    return {(r.cik, r.fiscal_year): (r.eps_prev, r.eps_2y_ago, r.revenue_prev) for r in df.itertuples()}
+
+def same(a, b):
+    return all(x == y or (np.isnan(x) and np.isnan(y)) for x, y in zip(a, b))
+
+def test_missing_fiscal_year_gives_nan_not_the_previous_row():
+    df = add_lags(frame([
+        ('0000000001', 2019, 1.0, 10.0),
+        ('0000000001', 2020, 2.0, 20.0),
+        # No 2021 filing
+        ('0000000001', 2022, 4.0, 40.0),
+        ('0000000001', 2023, 5.0, 50.0),
+    ]), SPEC)
+    result = lags_by_key(df)
+
+    assert same(result[('0000000001', 2020)], (1.0, np.nan, 10.0))
+    assert same(result[('0000000001', 2022)], (np.nan, 2.0, np.nan))
+    assert same(result[('0000000001', 2023)], (4.0, np.nan, 40.0))
+
+def test_lags_do_not_cross_companies():
+    df = add_lags(frame([
+        ('0000000001', 2022, 1.0, 10.0),
+        ('0000000002', 2023, 7.0, 70.0),
+    ]), SPEC)
+    result = lags_by_key(df)
+
+    assert same(result[('0000000002', 2023)], (np.nan, np.nan, np.nan))
+
+def test_unsorted_input_gives_the_same_lags_as_sorted():
+    rows = [
+        ('0000000002', 2021, 3.0, 30.0),
+        ('0000000001', 2023, 5.0, 50.0),
+        ('0000000002', 2020, 2.0, 20.0),
+        ('0000000001', 2021, 3.5, 35.0),
+        ('0000000002', 2022, 4.0, 40.0),
+        ('0000000001', 2022, 4.5, 45.0),
+    ]
+    unsorted = add_lags(frame(rows), SPEC)
+    ordered = add_lags(frame(sorted(rows)), SPEC)
+
+    assert list(unsorted['cik']) == [r[0] for r in rows] # Row order is kept
+    expected = lags_by_key(ordered)
+    for key, lags in lags_by_key(unsorted).items():
+        assert same(lags, expected[key])
+    assert same(lags_by_key(unsorted)[('0000000001', 2023)], (4.5, 3.5, 45.0))
+
+def test_categorical_cik_is_supported():
+    df = frame([('0000000001', 2021, 1.0, 10.0), ('0000000001', 2022, 2.0, 20.0)])
+    df['cik'] = df['cik'].astype('category')
+
+    assert same(lags_by_key(add_lags(df, SPEC))[('0000000001', 2022)], (1.0, np.nan, 10.0))
@@ -0,0 +1,41 @@
+"""PriceCache keeps the price date of the run that created it."""
+import datetime
+import types
+
+import pytest
+
+import import_all_sec_data
+from import_all_sec_data import PriceCache, fetch_prices_batched
+
+class FakeDate(datetime.date):
+    current = datetime.date(2026, 10, 16)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+@pytest.fixture
+def clock(monkeypatch):
+    FakeDate.current = datetime.date(2026, 10, 16)
+    monkeypatch.setattr(import_all_sec_data, 'datetime', types.SimpleNamespace(date=FakeDate))
+    return FakeDate
+
+def test_price_cache_day_survives_midnight(tmp_path, clock):
+    cache = PriceCache(str(tmp_path / 'price_cache.json'))
+    cache.put('GOOGL', 302.02)
+    clock.current = datetime.date(2026, 10, 17)
+
+    assert cache.get('GOOGL') == 302.02
+    assert cache.missing(['GOOGL', 'MSFT']) == ['MSFT']
+    assert PriceCache(str(tmp_path / 'price_cache.json')).get('GOOGL') is None
+
+def test_batched_prices_are_read_after_midnight(tmp_path, clock, monkeypatch):
+    pd = pytest.importorskip('pandas')
+    closes = pd.DataFrame({'GOOGL': [300.0, 302.02], 'MSFT': [410.5, None]})
+    monkeypatch.setattr(import_all_sec_data.yf, 'download',
+                        lambda *args, **kwargs: pd.concat({'Close': closes}, axis=1), raising=False)
+    cache = fetch_prices_batched(['GOOGL', 'MSFT'], PriceCache(str(tmp_path / 'price_cache.json')))
+    clock.current = datetime.date(2026, 10, 17)
+
+    assert cache.get('GOOGL') == 302.02
+    assert cache.get('MSFT') == 410.5
@@ -0,0 +1,78 @@
+"""De-cumulation of year-to-date 10-Q facts into sec_quarterly_reports rows."""
+from import_all_sec_data import build_quarterly_records
+
+CIK = '0000000042'
+
+def duration(start, end, val, form='10-Q', filed=None):
+    return {'start': start, 'end': end, 'val': val, 'form': form, 'filed': filed or end, 'fp': 'Q'}
+
+def instant(end, val, form='10-Q'):
+    return {'end': end, 'val': val, 'form': form, 'filed': end}
+
+def company(**tags):
+    return {'facts': {'us-gaap': {tag: {'units': {'USD': items}} for tag, items in tags.items()}}}
+
+def quarters(company_data):
+    return {(r['fiscal_year'], r['fiscal_quarter']): r for r in build_quarterly_records(company_data, CIK)}
+
+FY2024 = [
+    duration('2023-01-01', '2023-12-31', 600, form='10-K', filed='2024-02-01'),
+    duration('2024-01-01', '2024-03-31', 100, filed='2024-04-25'),
+    duration('2024-01-01', '2024-06-30', 250, filed='2024-07-25'),
+    duration('2024-01-01', '2024-09-30', 450, filed='2024-10-25'),
+    duration('2024-01-01', '2024-12-31', 700, form='10-K', filed='2025-02-05'),
+]
+
+def test_year_to_date_periods_are_decumulated():
+    result = quarters(company(Revenues=FY2024))
+
+    assert {key: r['revenue'] for key, r in result.items() if key[0] == 2024} == {
+        (2024, 1): 100,     # reported 3M
+        (2024, 2): 150,     # 6M - 3M
+        (2024, 3): 200,     # 9M - 6M
+        (2024, 4): 250,     # FY - 9M
+    }
+    q4 = result[(2024, 4)]
+    assert q4['period_end'] == '2024-12-31'
+    assert q4['form'] == '10-K'
+    assert q4['filing_date'] == '2025-02-05'
+    assert q4['cik'] == CIK
+
+def test_reported_three_month_values_win_over_differences():
+    net_income = [
+        duration('2024-01-01', '2024-03-31', 10),
+        duration('2024-01-01', '2024-06-30', 25),
+        duration('2024-04-01', '2024-06-30', 14),
+        duration('2024-01-01', '2024-12-31', 60, form='10-K'),
+    ]
+    result = quarters(company(Revenues=FY2024, NetIncomeLoss=net_income))
+
+    assert result[(2024, 2)]['net_income'] == 14
+    assert result[(2024, 2)]['revenue'] == 150
+
+def test_missing_quarter_leaves_a_gap():
+    revenues = FY2024 + [
+        duration('2025-01-01', '2025-03-31', 120),
+        # No 6M report for 2025, so neither Q2 nor Q3 can be derived
+        duration('2025-01-01', '2025-09-30', 480),
+    ]
+    result = quarters(company(Revenues=revenues))
+
+    assert result[(2025, 1)]['revenue'] == 120
+    assert (2025, 2) not in result
+    assert (2025, 3) not in result
+
+def test_balance_sheet_values_are_taken_at_quarter_end():
+    assets = [
+        instant('2024-03-31', 1000),
+        instant('2024-05-15', 9999), # Not a quarter end
+        instant('2024-06-30', 1100),
+        instant('2024-12-31', 1300, form='10-K'),
+    ]
+    result = quarters(company(Revenues=FY2024, Assets=assets))
+
+    assert result[(2024, 1)]['total_assets'] == 1000
+    assert result[(2024, 2)]['total_assets'] == 1100
+    assert result[(2024, 3)]['total_assets'] is None
+    assert result[(2024, 4)]['total_assets'] == 1300
+    assert all(r['period_end'] != '2024-05-15' for r in result.values())
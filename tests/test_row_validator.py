@@ -0,0 +1,98 @@
+"""RowValidator checks report rows against the column types of a tables.sql definition."""
+import pytest
+
+from import_all_sec_data import RowValidator, parse_table_columns
+
+DDL = """CREATE TABLE `sec_financial_reports` (
+  `cik` varchar(10) NOT NULL,
+  `fiscal_year` int(11) NOT NULL,
+  `filing_date` date DEFAULT NULL,
+  `revenue` decimal(19,4) DEFAULT NULL,
+  `shares_outstanding` bigint(20) DEFAULT NULL,
+  `eps` decimal(10,4) DEFAULT NULL,
+  `form` varchar(20) DEFAULT NULL,
+  PRIMARY KEY (`cik`,`fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci"""
+COLUMNS = ['cik', 'fiscal_year', 'filing_date', 'revenue', 'shares_outstanding', 'eps', 'form']
+CIK = '0001652044'
+
+def validator(policy):
+    return RowValidator(parse_table_columns(DDL), COLUMNS, policy=policy)
+
+def row(**values):
+    base = {'cik': CIK, 'fiscal_year': 2024, 'filing_date': '2025-02-05', 'revenue': 350018000000.0,
+            'shares_outstanding': 12211000000, 'eps': 8.04, 'form': '10-K'}
+    base.update(values)
+    return tuple(base[c] for c in COLUMNS)
+
+def value(validated_row, column):
+    return validated_row[COLUMNS.index(column)]
+
+def test_parse_table_columns_reads_types_and_sizes():
+    columns = parse_table_columns(DDL)
+    assert columns['cik'] == ('varchar', 10, None)
+    assert columns['revenue'] == ('decimal', 19, 4)
+    assert columns['shares_outstanding'] == ('bigint', 20, None)
+    assert columns['filing_date'] == ('date', None, None)
+
+def test_valid_rows_pass_unchanged():
+    rows, rejects = validator('null').validate([row(), row(fiscal_year=2023, eps=None)])
+    assert rows == [row(), row(fiscal_year=2023, eps=None)]
+    assert rejects == []
+
+@pytest.mark.parametrize('column, bad', [
+    ('eps', 1e6),                       # decimal(10,4) holds up to 6 integer digits
+    ('eps', -1e6),
+    ('revenue', float('inf')),
+    ('shares_outstanding', 2 ** 63),
+    ('shares_outstanding', -2 ** 63 - 1),
+    ('form', 'X' * 21),
+    ('filing_date', '2025-2-5'),
+    ('filing_date', 'not a date'),
+])
+def test_null_policy_replaces_invalid_values(column, bad):
+    rows, rejects = validator('null').validate([row(**{column: bad})])
+    assert value(rows[0], column) is None
+    assert rows[0] == row(**{column: None})
+    assert rejects == []
+
+def test_decimal_bounds():
+    rows, _ = validator('null').validate([row(eps=999999.9999), row(eps='12.5')])
+    assert value(rows[0], 'eps') == 999999.9999
+    assert value(rows[1], 'eps') == 12.5
+
+def test_bigint_bounds():
+    rows, _ = validator('null').validate([row(shares_outstanding=2 ** 63 - 1), row(shares_outstanding=-2 ** 63)])
+    assert value(rows[0], 'shares_outstanding') == 2 ** 63 - 1
+    assert value(rows[1], 'shares_outstanding') == -2 ** 63
+
+def test_clamp_policy_clamps_numbers_and_truncates_strings():
+    rows, rejects = validator('clamp').validate([
+        row(eps=1e6, shares_outstanding=2 ** 64, form='X' * 25),
+        row(fiscal_year=2023, eps=-1e7, shares_outstanding=-2 ** 64, filing_date='31/12/2023'),
+    ])
+    assert value(rows[0], 'eps') == 999999
+    assert value(rows[0], 'shares_outstanding') == 2 ** 63 - 1
+    assert value(rows[0], 'form') == 'X' * 20
+    assert value(rows[1], 'eps') == -999999
+    assert value(rows[1], 'shares_outstanding') == -2 ** 63
+    assert value(rows[1], 'filing_date') is None # A bad date cannot be clamped
+    assert rejects == []
+
+def test_quarantine_policy_nulls_and_records_rejects():
+    rows, rejects = validator('quarantine').validate([row(eps=1e6, form='X' * 21), row(fiscal_year=2023)])
+    assert rows == [row(eps=None, form=None), row(fiscal_year=2023)]
+    assert sorted(rejects) == sorted([
+        ('sec_financial_reports', CIK, 2024, 'eps', '1000000.0', 'outside decimal(10,4)'),
+        ('sec_financial_reports', CIK, 2024, 'form', 'X' * 21, 'longer than varchar(20)'),
+    ])
+
+@pytest.mark.parametrize('policy', RowValidator.POLICIES)
+def test_rows_with_invalid_keys_are_dropped_under_every_policy(policy):
+    rows, rejects = validator(policy).validate([row(cik='X' * 11), row(fiscal_year=2023)])
+    assert rows == [None, row(fiscal_year=2023)]
+    assert rejects == [('sec_financial_reports', 'X' * 11, None, 'cik', 'X' * 11, 'longer than varchar(10)')]
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        validator('ignore')
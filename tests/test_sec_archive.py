@@ -0,0 +1,41 @@
+"""zstd archives written with a dictionary from anywhere must be readable from sec_data/."""
+import json
+import os
+
+import pytest
+
+from sec_archive import ArchiveCodec, archive_path, dictionary_path, load_archive
+
+zstandard = pytest.importorskip('zstandard')
+
+def payload(i):
+    return {'cik': i, 'entityName': f"Company {i}", 'facts': {'us-gaap': {
+        'Revenues': {'units': {'USD': [{'fy': 2020 + y, 'fp': 'FY', 'form': '10-K', 'val': i * 1000 + y,
+                                        'end': f"{2020 + y}-12-31", 'filed': f"{2021 + y}-02-01"}
+                                       for y in range(5)]}}}}}
+
+def payload_bytes(i):
+    return json.dumps(payload(i)).encode('utf-8')
+
+def test_zstd_dictionary_outside_data_dir_round_trips(tmp_path):
+    data_dir = tmp_path / 'sec_data'
+    data_dir.mkdir()
+    dictionary = zstandard.train_dictionary(4096, [payload_bytes(i) for i in range(500)])
+    dict_file = tmp_path / 'elsewhere.dict'
+    dict_file.write_bytes(dictionary.as_bytes())
+
+    codec = ArchiveCodec('zstd', dict_path=str(dict_file), data_dir=str(data_dir))
+    assert codec.dict_path == dictionary_path(str(data_dir), dictionary.dict_id())
+    assert os.path.exists(codec.dict_path)
+
+    path = archive_path(str(data_dir), '0000000042', 'zstd')
+    with open(path, 'wb') as f:
+        f.write(codec.compress(payload_bytes(42)))
+    assert load_archive(path) == payload(42)
+
+def test_zstd_dictionary_without_id_is_rejected(tmp_path):
+    dict_file = tmp_path / 'raw.dict'
+    dict_file.write_bytes(payload_bytes(1))
+
+    with pytest.raises(ValueError, match='no dictionary id'):
+        ArchiveCodec('zstd', dict_path=str(dict_file), data_dir=str(tmp_path))
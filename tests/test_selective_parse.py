@@ -0,0 +1,31 @@
+"""The selective companyfacts parser must build the same reports as a full parse."""
+import os
+
+from import_all_sec_data import build_annual_records, parse_company_facts, parse_selected_facts
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'goog_facts.json')
+SAMPLE_CIK = '0001652044'
+SAMPLE_PRICE = 302.02
+
+def load_sample():
+    with open(SAMPLE_FILE, 'rb') as f:
+        return f.read()
+
+def by_year(records):
+    return sorted(records, key=lambda r: r['fiscal_year'])
+
+def test_selective_and_full_parse_build_identical_annual_records():
+    raw = load_sample()
+    full = build_annual_records(parse_company_facts(raw), SAMPLE_CIK, SAMPLE_PRICE)
+    selected, _ = parse_selected_facts(raw)
+
+    assert full
+    assert by_year(build_annual_records(selected, SAMPLE_CIK, SAMPLE_PRICE)) == by_year(full)
+
+def test_annual_records_do_not_depend_on_concept_order():
+    company_data = parse_company_facts(load_sample())
+    gaap = company_data['facts']['us-gaap']
+    reordered = {'facts': {'us-gaap': dict(reversed(list(gaap.items())))}}
+
+    assert (by_year(build_annual_records(reordered, SAMPLE_CIK, SAMPLE_PRICE))
+            == by_year(build_annual_records(company_data, SAMPLE_CIK, SAMPLE_PRICE)))
@@ -0,0 +1,112 @@
+"""ThrottleController pause / rate / circuit-breaker behaviour on a fake clock."""
+import pytest
+
+from import_all_sec_data import (CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS, THROTTLE_PAUSE_SECONDS,
+                                 THROTTLE_RECOVERY_SECONDS, ThrottleController)
+
+class FakeClock:
+    """Monotonic clock whose sleep() only advances time, recording each sleep."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def throttle(clock):
+    return ThrottleController(max_rate=8, clock=clock, sleep=clock.sleep)
+
+def test_push_back_pauses_every_caller_and_halves_the_rate(throttle, clock):
+    throttle.record_pushback(429)
+
+    # Every thread sees the same pause, whoever got the 429
+    assert throttle.blocked_for(clock()) == THROTTLE_PAUSE_SECONDS
+    assert throttle.blocked_for(clock() + 1) == THROTTLE_PAUSE_SECONDS - 1
+    assert throttle.rate == 4
+
+    throttle.acquire()
+    assert clock.sleeps == [THROTTLE_PAUSE_SECONDS]
+    throttle.acquire()
+    assert clock.sleeps[1:] == [pytest.approx(0.25)] # Only the halved token rate now
+
+def test_consecutive_push_backs_double_the_pause(throttle, clock):
+    throttle.record_pushback(429)
+    throttle.record_pushback(429)
+
+    assert throttle.blocked_for(clock()) == THROTTLE_PAUSE_SECONDS * 2
+    assert throttle.rate == 2
+
+def test_retry_after_is_honoured(throttle, clock):
+    throttle.record_pushback(429, retry_after=120)
+
+    assert throttle.blocked_for(clock()) == 120
+    throttle.acquire()
+    assert clock.sleeps == [120]
+
+def test_rate_recovers_one_step_per_quiet_period(throttle, clock):
+    throttle.record_pushback(429)
+    clock.now += THROTTLE_PAUSE_SECONDS
+    throttle.record_success()
+    assert throttle.rate == 4
+
+    clock.now += THROTTLE_RECOVERY_SECONDS
+    throttle.record_success()
+    assert throttle.rate == 5
+    throttle.record_success()
+    assert throttle.rate == 5
+
+    for _ in range(10):
+        clock.now += THROTTLE_RECOVERY_SECONDS
+        throttle.record_success()
+    assert throttle.rate == 8
+
+def test_circuit_opens_after_consecutive_failures(throttle, clock):
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        throttle.record_failure()
+    assert throttle.state == 'closed'
+    assert throttle.blocked_for(clock()) == 0
+
+    throttle.record_failure()
+    assert throttle.state == 'open'
+    assert throttle.blocked_for(clock()) == CIRCUIT_OPEN_SECONDS
+
+def test_success_resets_the_failure_count(throttle):
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        throttle.record_failure()
+    throttle.record_success()
+    throttle.record_failure()
+
+    assert throttle.state == 'closed'
+
+def test_one_probe_closes_the_circuit(throttle, clock):
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        throttle.record_failure()
+
+    throttle.acquire() # The probe, once the open period is over
+    assert clock.sleeps[0] == CIRCUIT_OPEN_SECONDS
+    assert throttle.state == 'half_open'
+    # Other callers wait for the probe's outcome
+    assert throttle.blocked_for(clock()) == ThrottleController.PROBE_POLL_SECONDS
+
+    throttle.record_success()
+    assert throttle.state == 'closed'
+    assert throttle.blocked_for(clock()) == 0
+
+def test_failed_probe_reopens_for_twice_as_long(throttle, clock):
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        throttle.record_failure()
+    throttle.acquire()
+
+    throttle.record_failure()
+    assert throttle.state == 'open'
+    assert throttle.blocked_for(clock()) == CIRCUIT_OPEN_SECONDS * 2